@@ -0,0 +1,230 @@
+import array
+from machine import ADC, Pin, Timer, idle
+
+COUNT_MASK = 0x3fffffff  # Sample counts wrap here, below the small int limit, so the timer never allocates
+
+
+class Channel:
+    """Ring buffer of one ADC input, filled by ADCScanner.
+
+    With window set, the channel also hands out sliding windows like the
+    chord detector's capture: a new window of the last window samples is
+    ready every hop samples, see take() and release(). end is then the
+    channel's sample count at the end of the taken window, so a reader can
+    tell how many samples passed since its last window.
+    """
+    def __init__(self, scanner, pin, rate, size, window=0, hop=0, burst=1):
+        self.scanner = scanner
+        self.adc = ADC(Pin(pin))
+        self.pin = pin
+        self.wanted = rate  # Requested rate, the div is worked out again when the scanner speeds up
+        self.div = 1  # Sampled every div scanner ticks, set by the scanner
+        self.rate = rate  # Actual rate, scanner rate / div
+        self.burst = burst  # Conversions averaged into each slow channel sample
+        self.window = window
+        self.hop = hop
+        # hop extra slots so the timer can keep writing while the last window is read out
+        self.ring = array.array('H', [0] * (window + hop if window else size))
+        self.buf = self.ring  # Buffer of the take() windows, as with the detector's Capture
+        self.overruns = 0  # Windows dropped because the reader fell behind
+        self.samples = 0  # Samples stored, modulo COUNT_MASK + 1
+        self.ready_end = 0  # samples at the end of the ready window
+        self.end = 0  # samples at the end of the window last returned by take()
+        self.reset()
+
+    def reset(self):
+        self.pos = 0  # Next write position
+        self.count = 0  # Samples since the last window
+        self.filled = 0  # Samples in the ring
+        self.start_pos = -1  # Oldest sample of the ready window, -1 if none
+        self.due = 0  # Scanner ticks until the next sample of a slow channel
+
+    def _store(self, v):
+        # Called from the timer, must not allocate
+        size = len(self.ring)
+        self.ring[self.pos] = v
+        self.pos += 1
+        if self.pos == size:
+            self.pos = 0
+        if self.filled < size:
+            self.filled += 1
+        self.samples = (self.samples + 1) & COUNT_MASK
+        if not self.window:
+            return
+        if self.filled < self.window:
+            return
+        if self.filled == self.window:
+            self.count = self.hop  # First full window
+        else:
+            self.count += 1
+        if self.count < self.hop:
+            return
+        self.count = 0
+        if self.start_pos >= 0:
+            self.overruns += 1  # Previous window was never taken
+        start = self.pos - self.window
+        if start < 0:
+            start += size
+        self.start_pos = start
+        self.ready_end = self.samples
+
+    def read_u16(self):
+        """Latest sample, a drop-in for ADC.read_u16() without waiting for a conversion"""
+        return self.ring[self.pos - 1]
+
+    def average(self, k):
+        """Mean of the last k samples (at most the ring size), as a read_u16() value"""
+        size = len(self.ring)
+        if k > self.filled:
+            k = self.filled
+        if k == 0:
+            return 0
+        total = 0
+        j = self.pos
+        for i in range(k):
+            j -= 1
+            if j < 0:
+                j = size - 1
+            total += self.ring[j]
+        return total // k
+
+    def take(self):
+        """Wait for the next window, returns its start: the window is at buf[start:] wrapping around"""
+        # start_pos is read again after ready_end: a window marked in between
+        # has moved it, and the newer window is taken instead
+        while True:
+            start = self.start_pos
+            if start < 0:
+                idle()
+                continue
+            end = self.ready_end
+            if self.start_pos == start:
+                break
+        self.start_pos = -1
+        self.end = end
+        return start  # Not a (buf, start) tuple, taking a window must not allocate
+
+    def release(self):
+        pass  # The ring has hop samples of slack, the window must be read out within one hop
+
+    def start(self):
+        """(Re)starts this channel with an empty ring, and the scanner if it is not running"""
+        self.reset()
+        self.scanner.attach(self)
+        self.scanner.start()
+
+    def stop(self):
+        """Stops sampling this channel, the scanner keeps running for the others"""
+        self.scanner.detach(self)
+
+
+class ADCScanner:
+    """Samples several ADC channels from one hardware timer.
+
+    The timer runs at rate, the fastest channel rate (the microphone).
+    Channels at that rate are read on every tick; slower channels (pots)
+    share the ticks, at most one of them per tick, so the fast channels
+    keep a fixed rate while the slow ones may slip by a few ticks.
+    A slow channel can oversample: each of its samples is then the mean
+    of a burst of conversions taken back to back.
+
+    The board has one scanner, see shared(), so the game's pots and the
+    chord detector's microphone are read from the same timer.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self.fast = []
+        self.slow = []
+        self.timer = Timer()
+        self.running = False
+
+    def add(self, pin, rate, size=16, window=0, hop=0, burst=1):
+        """New channel on pin sampled at about rate Hz, see Channel for window/hop/burst"""
+        if rate > self.rate:
+            raise ValueError("channel rate above scanner rate")
+        ch = Channel(self, pin, rate, size, window, hop, burst)
+        self.attach(ch)
+        return ch
+
+    def attach(self, ch):
+        """Samples ch from the next tick, a no-op if it already is"""
+        if ch in self.fast or ch in self.slow:
+            return
+        ch.div = int(self.rate // ch.wanted)
+        ch.rate = self.rate / ch.div
+        if ch.div == 1:
+            self.fast.append(ch)
+        else:
+            self.slow.append(ch)
+
+    def detach(self, ch):
+        """Stops sampling ch, and the timer once no channel is left"""
+        if ch in self.fast:
+            self.fast.remove(ch)
+        if ch in self.slow:
+            self.slow.remove(ch)
+        if not self.fast and not self.slow:
+            self.stop()
+
+    def speed_up(self, rate):
+        """Raises the scanner rate to rate, the channels keep their rates with new dividers"""
+        if rate <= self.rate:
+            return
+        self.rate = rate
+        channels = self.fast + self.slow
+        self.fast = []
+        self.slow = []
+        for ch in channels:
+            self.attach(ch)
+        if self.running:
+            self.timer.init(freq=self.rate, mode=Timer.PERIODIC, callback=self._tick)
+
+    def start(self):
+        """Starts the timer with empty channels, a no-op while it runs"""
+        if self.running:
+            return
+        for ch in self.fast:
+            ch.reset()
+        for i in range(len(self.slow)):
+            self.slow[i].reset()
+            self.slow[i].due = i  # Stagger the slow channels
+        self.running = True
+        self.timer.init(freq=self.rate, mode=Timer.PERIODIC, callback=self._tick)
+
+    def stop(self):
+        self.running = False
+        self.timer.deinit()
+
+    def _tick(self, t):
+        # Timer callback, must not allocate
+        for ch in self.fast:
+            ch._store(ch.adc.read_u16())
+        read = False
+        for ch in self.slow:
+            if ch.due > 0:
+                ch.due -= 1
+            if ch.due <= 0 and not read:
+                v = 0
+                for k in range(ch.burst):  # Back-to-back conversions, a few us each
+                    v += ch.adc.read_u16()
+                ch._store(v // ch.burst)
+                ch.due += ch.div
+                read = True  # One slow channel per tick
+
+
+_shared = None
+
+
+def shared(rate):
+    """The board's scanner, running at rate Hz or faster.
+
+    Created by the first caller; a later caller asking for a higher rate
+    speeds it up, so the game (pots at 1000 Hz) and the chord detector
+    (microphone at 5000 Hz) register their channels on the same timer.
+    """
+    global _shared
+    if _shared is None:
+        _shared = ADCScanner(rate)
+    else:
+        _shared.speed_up(rate)
+    return _shared
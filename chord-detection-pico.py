@@ -1,224 +1,290 @@
-import math
 import array
 import time
-from machine import ADC, Pin, UART
-
-# Global variables
-in_arr = array.array('i', [0] * 128)
-NoteV = bytearray([8, 23, 40, 57, 76, 96, 116, 138, 162, 187, 213, 241, 255])
-f_peaks = array.array('f', [0] * 8)  # top 8 frequencies peaks in descending order
+import _thread
+from machine import ADC, Pin, UART, Timer, idle
+from chord_engine import ChordEngine, EXTENDED
+from chord_core import (select_backend, pick_fft_size, FrameGate, STAGE_NAMES, CAPTURE, WINDOW, STEADY, FFT,
+                        NOTES, CHORD)
+import adc_scanner
+from stage_timer import StageTimer, HeapMeter
+from result_frame import ResultWriter
+from goertzel_bank import GoertzelBank
 
 # Setup for Pi Pico
 # Pi Pico has ADC on GPIO 26-29 (ADC0-ADC3) and internal temp sensor on ADC4
-adc = ADC(Pin(26))  # Using ADC0 (GPIO26) - adjust as needed
+MIC_PIN = 26  # Using ADC0 (GPIO26) - adjust as needed, e.g. GP28 next to the game's pots
 uart = UART(0, baudrate=250000)  # UART0 on Pi Pico
 
-def main():
-    print("Chord Detection for Raspberry Pi Pico")
-    print("Ready to detect chords...")
-    
-    while True:
-        chord_det()
-        time.sleep_ms(10)  # Small delay between detections
+SAMPLE_RATE = 5000  # Fixed sampling frequency in Hz, driven by a hardware timer
+HOP = 32  # Streaming mode: new samples per chord estimate, 0 for back to back frames
+DUAL_CORE = False  # Take and window frames on core 1, FFT and chord scoring on core 0
+FIXED_POINT = False  # Integer-only frame path (Q15 FFT, no floats) that allocates nothing per frame, python backend only
+GOERTZEL = False  # Note filter bank (goertzel_det) instead of FFT and peak picking
+BACKEND = None  # 'ulab', 'numpy' or 'python', None picks the fastest available
+FFT_SIZE = 0  # Samples per frame (128 to 1024), 0 picks the largest that fits in free memory
 
-def chord_det():
-    """Chord detection function"""
-    sum1 = 0
-    sum2 = 0
-    
-    # Start timing
-    a1 = time.ticks_us()
-    
-    # Data collection with Hann window
-    for i in range(128):
-        # Pi Pico ADC is 12-bit (0-4095)
-        a = adc.read_u16() >> 4  # Convert 16-bit to 12-bit (0-4095)
-        a = a - 2048  # Zero shift for 12-bit ADC
-        
-        # Utilizing time between two samples for windowing & amplitude calculation
-        sum1 += a  # To average value
-        sum2 += a * a  # To RMS value
-        a = a * (math.sin(i * math.pi / 128) * math.sin(i * math.pi / 128))  # Hann window
-        in_arr[i] = int(4 * a)  # Scaling for float to int conversion
-        time.sleep_us(195)  # Based on operation frequency range
+# Bins are SAMPLE_RATE / FFT_N wide, 39 Hz at 128 and 4.9 Hz at 1024
+FFT_N = pick_fft_size(FFT_SIZE)
+
+class Capture:
+    """Timer driven ADC capture into two preallocated buffers, one filling while the other is processed"""
+    def __init__(self, adc, n, rate):
+        self.adc = adc
+        self.n = n
+        self.rate = rate
+        self.bufs = (array.array('H', [0] * n), array.array('H', [0] * n))
+        self.buf = self.bufs[0]  # Buffer handed out by the last take()
+        self.fill = 0  # Buffer the timer is writing into
+        self.idx = 0
+        self.ready = -1  # Full buffer waiting for the detector, -1 if none
+        self.busy = -1  # Buffer the detector is working on, -1 if none
+        self.overruns = 0  # Frames dropped because the detector fell behind
+        self.samples = 0  # Samples captured, modulo COUNT_MASK + 1
+        self.ends = [0, 0]  # samples at the end of each buffer
+        self.end = 0  # samples at the end of the buffer last returned by take()
+        self.timer = Timer()
     
-    # End timing
-    b = time.ticks_us()
+    def start(self):
+        self.idx = 0
+        self.ready = -1
+        self.busy = -1
+        self.timer.init(freq=self.rate, mode=Timer.PERIODIC, callback=self._tick)
     
-    # Calculate amplitude and sampling frequency
-    sum1 = sum1 / 128  # Average amplitude
-    sum2 = math.sqrt(sum2 / 128)  # RMS amplitude
-    sampling = 128000000 / time.ticks_diff(b, a1)  # Real time sampling frequency
+    def stop(self):
+        self.timer.deinit()
     
-    # For very low or no amplitude, this code won't start
-    # It takes very small amplitude of sound to initiate for value sum2-sum1>3
-    if sum2 - sum1 > 3:
-        fft(128, sampling)  # Optimized FFT code
-        
-        # Clear first 12 positions in input array
-        for i in range(12):
-            in_arr[i] = 0
-        
-        j = 0
-        k = 0
-        # Below loop will convert frequency value to note
-        for i in range(8):
-            if f_peaks[i] > 1040:
-                f_peaks[i] = 0
-            if 65.4 <= f_peaks[i] <= 130.8:
-                f_peaks[i] = 255 * ((f_peaks[i] / 65.4) - 1)
-            if 130.8 <= f_peaks[i] <= 261.6:
-                f_peaks[i] = 255 * ((f_peaks[i] / 130.8) - 1)
-            if 261.6 <= f_peaks[i] <= 523.25:
-                f_peaks[i] = 255 * ((f_peaks[i] / 261.6) - 1)
-            if 523.25 <= f_peaks[i] <= 1046:
-                f_peaks[i] = 255 * ((f_peaks[i] / 523.25) - 1)
-            if 1046 <= f_peaks[i] <= 2093:
-                f_peaks[i] = 255 * ((f_peaks[i] / 1046) - 1)
-            if f_peaks[i] > 255:
-                f_peaks[i] = 254
-                
-            j = 1
-            k = 0
-            while j == 1:
-                if f_peaks[i] <= NoteV[k]:
-                    f_peaks[i] = k
-                    j = 0
-                k += 1  # A note with max peaks (harmonic) with amplitude priority is selected
-                if k > 15:
-                    j = 0
-            
-            if f_peaks[i] == 12:
-                f_peaks[i] = 0
-            k = int(f_peaks[i])
-            in_arr[k] = in_arr[k] + (8 - i)
-        
-        # Find note with maximum value
-        k = 0
-        j = 0
-        for i in range(12):
-            if k < in_arr[i]:
-                k = in_arr[i]
-                j = i
-        
-        # Copy first 8 values to positions 12-19
-        for i in range(8):
-            in_arr[12 + i] = in_arr[i]
-        
-        # Chord check
-        for i in range(12):
-            in_arr[20 + i] = in_arr[i] * in_arr[i + 4] * in_arr[i + 7]  # Major chord
-            in_arr[32 + i] = in_arr[i] * in_arr[i + 3] * in_arr[i + 7]  # Minor chord
-        
-        # Find chord with max possibility
-        for i in range(24):
-            in_arr[i] = in_arr[i + 20]
-            if k < in_arr[i]:
-                k = in_arr[i]
-                j = i
-        
-        # Major-minor check
-        chord = j
-        if chord > 11:
-            chord = chord - 12
-            chord_out = 'm'
-        else:
-            chord_out = ' '
-        
-        # Print detected chord
-        k = chord
-        chord_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-        result = f"{chord_names[k]}{chord_out}"
-        print(result)
-        uart.write(result + '\n')  # Also output to UART
-
-def fft(N, frequency):
-    """FFT Function optimized for 128 sample size to reduce memory consumption"""
-    data = [1, 2, 4, 8, 16, 32, 64, 128]
-    a = N
+    def _tick(self, t):
+        # Timer callback, must not allocate
+        self.bufs[self.fill][self.idx] = self.adc.read_u16()
+        self.idx += 1
+        if self.idx < self.n:
+            return
+        self.idx = 0
+        self.samples = (self.samples + self.n) & adc_scanner.COUNT_MASK
+        self.ends[self.fill] = self.samples
+        nxt = self.fill ^ 1
+        if nxt == self.busy:
+            # Detector still owns the other buffer, refill this one
+            self.overruns += 1
+            return
+        if self.ready == nxt:
+            self.overruns += 1  # Previous frame was never taken
+        self.ready = self.fill
+        self.fill = nxt
     
-    # Calculate the levels
-    o = 7  # Hardcoded for N=128
+    def take(self):
+        """Wait for a full buffer and hand it to the caller as buf until release(), returns its start, 0"""
+        # Claim the ready buffer through busy first: from then on _tick refills
+        # its own buffer instead of moving to this one. If it completed a buffer
+        # before the claim landed, ready has changed and the claim is retried.
+        # Timer callbacks run at bytecode boundaries, so disable_irq() alone
+        # would not keep an already scheduled one out.
+        while True:
+            i = self.ready
+            if i < 0:
+                idle()
+                continue
+            self.busy = i
+            if self.ready == i:
+                break
+            self.busy = -1
+        self.ready = -1
+        self.buf = self.bufs[i]
+        self.end = self.ends[i]
+        return 0
     
-    # Arrays for FFT calculation
-    in_ps = array.array('B', [0] * data[o])  # Input for sequencing
-    out_r = array.array('f', [0] * data[o])  # Real part of transform
-    out_im = array.array('f', [0] * data[o])  # Imaginary part of transform
+    def release(self):
+        self.busy = -1
+
+class FramePipe:
+    """Two preallocated windowed frames handed from core 1 (capture) to core 0 (analysis).
+
+    The lock only guards the buffer indices; the frames themselves are
+    filled and read outside it, each side only touches a buffer it owns.
+    """
+    def __init__(self, frames, period_us):
+        self.frames = frames  # Two frame buffers of the backend
+        self.level = array.array('i' if backend.fixed_point else 'f', [0, 0])  # RMS minus mean amplitude of each frame
+        self.stamp = array.array('i', [0, 0])  # ticks_us when each frame was published
+        self.period_us = period_us  # A frame waiting longer than this counts as late
+        self.lock = _thread.allocate_lock()
+        self.ready = -1  # Published frame waiting for core 0, -1 if none
+        self.busy = -1  # Frame core 0 is analysing, -1 if none
+        self.dropped = 0  # Frames replaced by a newer one before core 0 took them
+        self.late = 0  # Frames core 0 took more than period_us after they were published
     
-    x = 0
-    # Bit reversal
-    for b in range(o):
-        c1 = data[b]
-        f = data[o] // (c1 + c1)
-        for j in range(c1):
-            x = x + 1
-            in_ps[x] = in_ps[j] + f
+    def claim(self):
+        """Core 1: index of a frame to fill, drops the waiting frame if core 0 is still busy"""
+        self.lock.acquire()
+        i = 0
+        if self.busy >= 0:
+            i = self.busy ^ 1
+        elif self.ready >= 0:
+            i = self.ready ^ 1  # Keep the waiting frame for core 0
+        if i == self.ready:
+            self.ready = -1
+            self.dropped += 1
+        self.lock.release()
+        return i
     
-    # Update input array as per bit reverse order
-    for i in range(data[o]):
-        if in_ps[i] < a:
-            out_r[i] = in_arr[in_ps[i]]
-        if in_ps[i] > a:
-            out_r[i] = in_arr[in_ps[i] - a]
+    def publish(self, i, level):
+        """Core 1: frame i is complete"""
+        self.level[i] = level
+        self.stamp[i] = time.ticks_us()
+        self.lock.acquire()
+        self.ready = i
+        self.lock.release()
     
-    # FFT calculation
-    for i in range(o):
-        i10 = data[i]  # Overall values of sine cosine
-        i11 = data[o] // data[i + 1]  # Loop with similar sine cosine
-        e = 6.283 / data[i + 1]
-        e = 0 - e
-        n1 = 0
-        
-        for j in range(i10):
-            c = math.cos(e * j)
-            s = math.sin(e * j)
-            n1 = j
-            
-            for k in range(i11):
-                tr = c * out_r[i10 + n1] - s * out_im[i10 + n1]
-                ti = s * out_r[i10 + n1] + c * out_im[i10 + n1]
-                
-                out_r[n1 + i10] = out_r[n1] - tr
-                out_r[n1] = out_r[n1] + tr
-                
-                out_im[n1 + i10] = out_im[n1] - ti
-                out_im[n1] = out_im[n1] + ti
-                
-                n1 = n1 + i10 + i10
+    def take(self):
+        """Core 0: wait for the next frame, returns its index, owned until release()"""
+        while True:
+            self.lock.acquire()
+            i = self.ready
+            if i >= 0:
+                self.busy = i
+                self.ready = -1
+            self.lock.release()
+            if i >= 0:
+                break
+            idle()
+        if time.ticks_diff(time.ticks_us(), self.stamp[i]) > self.period_us:
+            self.late += 1
+        return i
     
-    # Calculate amplitude from complex number
-    for i in range(data[o - 1]):
-        out_r[i] = math.sqrt((out_r[i] * out_r[i]) + (out_im[i] * out_im[i]))
-        out_im[i] = (i * frequency) / data[o]  # Frequency bin
+    def release(self):
+        self.lock.acquire()
+        self.busy = -1
+        self.lock.release()
+
+# Per-stage timing and heap bytes per frame, send 't' over UART for a report and 'r' to reset
+timing = StageTimer(STAGE_NAMES, HeapMeter())
+
+# Detection flow of chord_core, on the fastest backend this firmware has
+backend = select_backend(FFT_N, BACKEND, EXTENDED, timing, FIXED_POINT)  # TRIADS for major/minor only
+backend.note_table.update(SAMPLE_RATE)
+
+# Skips silent frames and reuses the last chord while the sound is steady
+gate = FrameGate()
+
+# Results go out as binary frames with the note bins, host/uart_decode.py reads them
+link = ResultWriter(uart, notes=True)
+
+if HOP:
+    # Streaming capture through the board's shared scanner, the game's
+    # pots sample from the same timer (main.py)
+    scanner = adc_scanner.shared(SAMPLE_RATE)
+    capture = scanner.add(MIC_PIN, SAMPLE_RATE, window=FFT_N, hop=HOP)
+else:
+    capture = Capture(ADC(Pin(MIC_PIN)), FFT_N, SAMPLE_RATE)
+
+if GOERTZEL:
+    bank = GoertzelBank(SAMPLE_RATE)
+    fed = -1  # capture.end of the last sample fed to the bank, -1 before the first
+    chroma = array.array('f', [0] * 12)
+    bank_engine = ChordEngine(EXTENDED)  # Scores the bank's plain array chroma
+
+if DUAL_CORE:
+    pipe = FramePipe((backend.new_frame(), backend.new_frame()), (HOP or FFT_N) * 1000000 // SAMPLE_RATE)
+
+def main():
+    print("Chord Detection for Raspberry Pi Pico")
+    print("Ready to detect chords...")
     
-    # Peak detection
-    x = 0
-    for i in range(1, data[o - 1] - 1):
-        if out_r[i] > out_r[i - 1] and out_r[i] > out_r[i + 1]:
-            in_ps[x] = i  # in_ps array used for storage of peak number
-            x = x + 1
+    capture.start()
+    if GOERTZEL:
+        while True:
+            goertzel_det()
+    if DUAL_CORE:
+        _thread.start_new_thread(capture_core, ())
+        while True:
+            analysis_core()
+    while True:
+        chord_det()  # Next frame is captured while this one is analysed
+
+def chord_det():
+    """Chord detection function"""
+    timing.poll(uart)
+    timing.start()
+    j = capture.take()
+    timing.mark(CAPTURE)
+    level = backend.load(capture.buf, j)
+    capture.release()  # Timer may now reuse this buffer
+    timing.mark(WINDOW)
+    analyse(backend.frame, level)
+
+def goertzel_det():
+    """Chord detection on the Goertzel bank, which only needs the samples new since the last frame"""
+    timing.poll(uart)
+    timing.start()
+    j = capture.take()
+    timing.mark(CAPTURE)
+    global fed
+    new = (capture.end - fed) & adc_scanner.COUNT_MASK  # Samples since the last feed, HOP unless windows were dropped
+    if fed < 0 or new > FFT_N:
+        # Some of them are gone: restart the filters on this window rather than run them across the gap
+        if fed >= 0:
+            bank.overruns += 1
+        bank.reset()
+        new = FFT_N
+    fed = capture.end
+    j = (j + FFT_N - new) % len(capture.buf)
+    bank.update(SAMPLE_RATE)
+    level = bank.feed(capture.buf, j, new)
+    capture.release()
+    timing.mark(FFT)  # The bank stands in for windowing and FFT
+
+    if gate.open(level):
+        bank.chroma(chroma)
+        timing.mark(NOTES)
+        idx = bank_engine.index(chroma, bank.bass)
+        timing.mark(CHORD)
+        print(bank_engine.names[idx])
+        link.send(idx, bank_engine.score8, chroma)
+
+def capture_core():
+    """Core 1 loop: take captured frames and window them into the pipe"""
+    while True:
+        j = capture.take()
+        i = pipe.claim()
+        level = backend.load(capture.buf, j, pipe.frames[i])
+        capture.release()
+        pipe.publish(i, level)
+
+def analysis_core():
+    """Core 0: analyse the next frame from the pipe, CAPTURE times the wait for it"""
+    timing.poll(uart)
+    timing.start()
+    i = pipe.take()
+    timing.mark(CAPTURE)
+    analyse(pipe.frames[i], pipe.level[i])
+    pipe.release()
+
+def analyse(frame, level):
+    """Chord of a loaded frame, printed and sent over UART"""
+    # Silence below the adaptive noise floor is not analysed at all
+    if not gate.open(level):
+        return
     
-    # Rearrange as per magnitude
-    s = 0
-    c = 0
-    for i in range(x):
-        for j in range(c, x):
-            if out_r[in_ps[i]] < out_r[in_ps[j]]:
-                s = in_ps[i]
-                in_ps[i] = in_ps[j]
-                in_ps[j] = s
-        c = c + 1
+    fp = backend.fingerprint(frame)
+    steady = gate.steady(level, fp)
+    timing.mark(STEADY)
+    if steady:
+        # Same sound as the last analysed frame, its chord still holds
+        idx = gate.chord
+        score8 = gate.score8
+        chroma = gate.chroma
+    else:
+        chroma = backend.chroma(SAMPLE_RATE, frame)  # Marks FFT, PEAKS and NOTES
+        
+        # Chord check
+        idx = backend.engine.index(chroma, backend.bass)
+        score8 = backend.engine.score8
+        timing.mark(CHORD)
+        gate.hold(level, fp, idx, score8, chroma)
     
-    # Update f_peaks array with frequencies in descending order
-    for i in range(8):
-        if i < x:  # Make sure we have enough peaks
-            # Weighted average of peak and adjacent bins for better frequency resolution
-            f_peaks[i] = (out_im[in_ps[i] - 1] * out_r[in_ps[i] - 1] + 
-                         out_im[in_ps[i]] * out_r[in_ps[i]] + 
-                         out_im[in_ps[i] + 1] * out_r[in_ps[i] + 1]) / \
-                        (out_r[in_ps[i] - 1] + out_r[in_ps[i]] + out_r[in_ps[i] + 1])
-        else:
-            f_peaks[i] = 0
+    # Print detected chord
+    print(backend.engine.names[idx])
+    link.send(idx, score8, chroma)  # Also output to UART
 
 # Run the main function
 if __name__ == "__main__":
@@ -0,0 +1,749 @@
+import gc
+import math
+import array
+from chord_engine import ChordEngine, EXTENDED, NO_BASS, BASS_LEVEL
+from stage_timer import StageTimer
+
+try:
+    import chord_kernels  # Native and viper builds of PythonBackend's hot loops
+except (ImportError, SyntaxError, NameError, AttributeError):
+    chord_kernels = None  # CPython, or firmware built without the native emitters
+
+LOW_C = 65.4  # C2, lowest note considered
+MAX_FREQ = 1040  # Peaks above this are ignored
+NO_NOTE = 12  # Table entry for positions outside the note range
+NOTE_STEPS = 4  # Table entries per FFT bin, for interpolated peak positions
+RATE_TOLERANCE = 0.01  # Rebuild the note table when the rate drifts by more than this fraction
+TOP_PEAKS = 8  # Strongest spectral peaks that vote for notes, weights TOP_PEAKS down to 1
+GATE = 3  # Frames whose RMS minus mean amplitude is not above this are always skipped
+
+# FrameGate: silence and steady sound skip the analysis
+FLOOR_MARGIN = 2  # Frames must be this many times above the noise floor to count as sound
+FLOOR_RISE = 10  # The noise floor rises by 2**-FLOOR_RISE per louder silent frame, quieter frames pull it down at once
+FLOOR_CAP = 128  # Highest noise floor in ADC counts, so a device that starts in loud sound does not take it for noise
+ONSET = 2  # A level rise by this factor is a new note, analysed even if the fingerprint matches
+CHANGE = 77  # Largest fingerprint difference of a steady sound, 0.3 in the -256 to 256 of the fingerprints
+MAX_HOLD = 16  # Steady frames answered with the last chord before one is analysed again
+FP_LAGS = 16  # Autocorrelation lags in the fingerprint
+FP_SPAN = 256  # Frame samples the fingerprint correlates at most, from the middle of the frame
+FP_POINTS = 64  # Evenly spaced products per lag
+
+# Stages timed through the backends' StageTimer
+CAPTURE, WINDOW, STEADY, FFT, PEAKS, NOTES, CHORD = range(7)
+STAGE_NAMES = ('capture', 'window', 'steady', 'fft', 'peaks', 'notes', 'chord')
+
+BACKENDS = ('ulab', 'numpy', 'python')  # Fastest first, see select_backend()
+
+FFT_SIZES = (1024, 512, 256, 128)  # Supported frame sizes, largest first
+BYTES_PER_POINT = 96  # RAM per frame sample for all buffers and tables, with the garbage of building them
+MEM_RESERVE = 24 * 1024  # Left free for the rest of the program
+
+
+def pick_fft_size(size):
+    """size if set, otherwise the largest of FFT_SIZES whose buffers fit in gc.mem_free()"""
+    if size:
+        if size not in FFT_SIZES:
+            raise ValueError("FFT size must be one of 128, 256, 512, 1024")
+        return size
+    gc.collect()
+    free = gc.mem_free() - MEM_RESERVE
+    for n in FFT_SIZES:
+        if n * BYTES_PER_POINT <= free:
+            return n
+    return FFT_SIZES[-1]
+
+
+def select_backend(n, name=None, qualities=EXTENDED, timing=None, fixed_point=False):
+    """Backend for n sample frames: the named one, or the fastest one that imports.
+
+    name is one of BACKENDS. fixed_point selects the integer frame path
+    of the python backend, and the python backend itself unless name
+    says otherwise; the array backends always work in floats.
+    """
+    if fixed_point and name is None:
+        name = 'python'
+    for b in (BACKENDS if name is None else (name,)):
+        if b == 'python':
+            return PythonBackend(n, qualities, timing, fixed_point)
+        try:
+            if b == 'ulab':
+                from ulab import numpy as np
+            elif b == 'numpy':
+                import numpy as np
+            else:
+                raise ValueError("unknown backend " + b)
+        except ImportError:
+            if name is not None:
+                raise
+            continue
+        return ArrayBackend(np, b, n, qualities, timing)
+
+
+def fingerprint_shape(n):
+    """(first sample, span, stride, lag step) of the fingerprint of n sample frames, lags step to FP_LAGS * step"""
+    span = min(FP_SPAN, n // 2)
+    stride = span // FP_POINTS
+    step = 2 * stride  # Lags on the sample grid of the products, twice as far apart
+    return (n - span - FP_LAGS * step) // 2, span, stride, step
+
+
+def isqrt(x):
+    """Integer square root of 0 <= x < 2**30, without floats"""
+    r = 0
+    b = 1 << 28
+    while b > x:
+        b >>= 2
+    while b:
+        if x >= r + b:
+            x -= r + b
+            r = (r >> 1) + b
+        else:
+            r >>= 1
+        b >>= 2
+    return r
+
+
+class FrameGate:
+    """Decides which frames need the full analysis.
+
+    open(level) tracks the noise floor, the lower envelope of the frame
+    levels, and is false for frames that do not stand out of it.
+    steady(level, fp) compares the fingerprint of a sounding frame,
+    its autocorrelation at a few lags (a coarse spectrum), with the one
+    last analysed and is true while the sound has not changed; the
+    caller then reuses the result saved by hold(). A level onset or
+    MAX_HOLD steady frames in a row force a fresh analysis.
+
+    All state is integer, so with integer levels (PythonBackend in
+    fixed point) the gate allocates nothing.
+    """
+
+    def __init__(self):
+        self.floor = 0  # Noise floor, RMS minus mean amplitude times 1024, 0 until the first frame
+        self.floor_min = GATE * 1024 // FLOOR_MARGIN
+        self.level = 0  # Level of the last analysed frame
+        self.fp = array.array('i', [0] * FP_LAGS)  # Its fingerprint
+        self.held = MAX_HOLD  # Steady frames since, MAX_HOLD if the next must be analysed
+        self.chord = 0  # Its result, see hold()
+        self.score8 = 0
+        self.chroma = array.array('i', [0] * 12)
+
+    def open(self, level):
+        """Update the noise floor, true if level is sound rather than silence.
+
+        The floor starts at the first level and drops to any quieter
+        frame. Only silent frames raise it, by FLOOR_RISE each, so a
+        louder background is learnt while sound of any length never
+        becomes the floor. It stays below FLOOR_CAP: a device that
+        starts in loud sound analyses it instead of taking it for noise.
+        """
+        level = int(level * 1024)
+        floor = self.floor
+        if level < floor or not floor:
+            floor = level
+        elif level > FLOOR_MARGIN * floor:
+            return True  # Sound, the floor stays
+        else:
+            floor += floor >> FLOOR_RISE
+        if floor < self.floor_min:
+            floor = self.floor_min  # Never below the fixed GATE
+        elif floor > FLOOR_CAP * 1024:
+            floor = FLOOR_CAP * 1024
+        self.floor = floor
+        if level > FLOOR_MARGIN * floor:
+            return True
+        self.held = MAX_HOLD  # Whatever comes after silence is new
+        return False
+
+    def steady(self, level, fp):
+        """True if the frame sounds like the last analysed one, its result can be reused"""
+        if self.held >= MAX_HOLD or level > ONSET * self.level:
+            return False
+        ref = self.fp
+        for i in range(FP_LAGS):
+            d = fp[i] - ref[i]
+            if d > CHANGE or d < -CHANGE:
+                return False
+        self.held += 1
+        return True
+
+    def hold(self, level, fp, chord, score8, chroma):
+        """Save an analysed frame and its chord result for the steady frames after it"""
+        self.level = level
+        for i in range(FP_LAGS):
+            self.fp[i] = fp[i]
+        self.chord = chord
+        self.score8 = score8
+        for i in range(12):
+            self.chroma[i] = int(chroma[i])
+        self.held = 0
+
+
+class NoteTable:
+    """Maps an interpolated FFT bin position straight to a pitch class index (0 = C)"""
+    def __init__(self, n, steps, np=None):
+        self.n = n
+        self.steps = steps
+        self.np = np
+        self.table = bytearray(n // 2 * steps + 1)
+        self.array = None  # np copy of the table for np.take
+        self.rate = 0
+        self.scale = 0  # Table index per Hz
+
+    def update(self, rate):
+        """Rebuild the table for a new sampling rate, a no-op while rate stays within tolerance"""
+        if rate == self.rate:
+            return  # Fixed rate, no float math
+        if self.rate and abs(rate - self.rate) <= RATE_TOLERANCE * self.rate:
+            return
+        self.rate = rate
+        self.scale = self.n * self.steps / rate
+        for i in range(len(self.table)):
+            f = i / self.scale
+            if f < LOW_C or f > MAX_FREQ:
+                self.table[i] = NO_NOTE
+            else:
+                # Nearest semitone above C2, same bins as the NoteV thresholds of the reference code
+                self.table[i] = int(12 * math.log(f / LOW_C) / math.log(2) + 0.5) % 12
+        if self.np is not None:
+            self.array = self.np.array(self.table, dtype=self.np.uint8)
+
+
+def q15(x):
+    """x in [-1, 1] as a 16 bit fixed-point integer, 1.0 saturates to 32767"""
+    return max(-32768, min(32767, int(round(x * 32768))))
+
+
+class FFTPlan:
+    """Tables for an N point FFT, computed once so fft() and the sampler only index into them"""
+    def __init__(self, N):
+        self.N = N
+        o = 0
+        while (1 << o) < N:
+            o += 1
+        self.o = o  # Number of levels
+
+        # Bit reversal order of the input
+        self.rev = array.array('H', [0] * N)
+        x = 0
+        for b in range(o):
+            c1 = 1 << b
+            f = N // (c1 + c1)
+            for j in range(c1):
+                x = x + 1
+                self.rev[x] = self.rev[j] + f
+
+        # Twiddle factors, cos/sin(-2*pi*k/N) for k < N/2
+        self.cos_t = array.array('f', [math.cos(2 * math.pi * k / N) for k in range(N // 2)])
+        self.sin_t = array.array('f', [-math.sin(2 * math.pi * k / N) for k in range(N // 2)])
+
+        # Hann window coefficients
+        self.window = array.array('f', [math.sin(i * math.pi / N) * math.sin(i * math.pi / N) for i in range(N)])
+
+        # Work arrays of fft()
+        self.out_r = array.array('f', [0] * N)  # Real part of transform
+        self.out_im = array.array('f', [0] * N)  # Imaginary part of transform
+
+        # Integer path, see fft_q15(): Q15 twiddles and window, work arrays
+        self.cos_q = array.array('h', [q15(c) for c in self.cos_t])
+        self.sin_q = array.array('h', [q15(s) for s in self.sin_t])
+        self.window_q = array.array('h', [q15(w) for w in self.window])
+        self.re = array.array('i', [0] * N)
+        self.im = array.array('i', [0] * N)
+        self.power = array.array('i', [0] * (N // 2))  # Squared magnitudes, below 2**30
+        self.peaks = array.array('H', [0] * N)  # Peak bins, shared by both FFTs
+        self.positions = array.array('H', [0] * TOP_PEAKS)  # Note table positions of the fft_q15() peaks
+        self.exp = 0  # Scale of the last fft_q15() spectrum, 2**exp
+
+
+class PythonBackend:
+    """The detection flow on plain arrays, for firmware without ulab.
+
+    All backends share this API: new_frame() makes a frame buffer,
+    load() windows captured samples into one and returns the amplitude
+    for the gate, fingerprint() gives the FrameGate fingerprint of a
+    loaded frame, chroma() turns it into a 12 bin chroma vector for
+    engine.index(). Frames default to the backend's own frame.
+
+    With fixed_point every step from load() to engine.index() runs on
+    small ints in preallocated arrays: the level, the Q15 FFT, the peak
+    positions and the chord scores. No float objects are made, so on
+    MicroPython a frame allocates nothing on the heap.
+
+    The windowing, the transforms and the peak scans run as the native
+    and viper kernels of chord_kernels when the firmware has them and
+    native is set, otherwise as the bytecode loops below.
+    """
+    name = 'python'
+
+    def __init__(self, n, qualities=EXTENDED, timing=None, fixed_point=False, native=True):
+        self.n = n
+        self.fixed_point = fixed_point  # Integer-only frame path (fft_q15) instead of software floats
+        self.kernels = chord_kernels if native else None  # None if unavailable too
+        self.plan = FFTPlan(n)
+        self.note_table = NoteTable(n, NOTE_STEPS)
+        self.engine = ChordEngine(qualities, fixed_point=fixed_point)
+        self.timing = timing or StageTimer(STAGE_NAMES)
+        self.frame = self.new_frame()
+        self.f_peaks = array.array('f', [0] * TOP_PEAKS)  # top 8 frequencies peaks in descending order
+        self.fp = array.array('i', [0] * FP_LAGS)
+        self.bass = NO_BASS  # Pitch class of the lowest note peak of the last chroma(), for engine.index()
+        # Fixed per n, kept as attributes so fingerprint() builds no tuple per frame
+        self.fp_start, self.fp_span, self.fp_stride, self.fp_step = fingerprint_shape(n)
+
+    def new_frame(self):
+        return array.array('i', [0] * self.n)
+
+    def load(self, buf, j, out=None):
+        """Hann windowed n read_u16() samples of buf from j on (wrapping) into out, returns RMS minus mean amplitude"""
+        if out is None:
+            out = self.frame
+        if self.kernels:
+            if self.fixed_point:
+                return self.kernels.load_q15(buf, j, out, self.plan)
+            return self.kernels.load(buf, j, out, self.plan)
+        n = self.n
+        sum1 = 0
+        sum2 = 0
+
+        window = self.plan.window
+        window_q = self.plan.window_q
+        fixed_point = self.fixed_point
+        m = len(buf)
+
+        # Windowing of the captured frame, oldest sample first
+        for i in range(n):
+            # Pi Pico ADC is 12-bit (0-4095)
+            a = buf[j] >> 4  # Convert 16-bit to 12-bit (0-4095)
+            j += 1
+            if j == m:
+                j = 0
+            a = a - 2048  # Zero shift for 12-bit ADC
+
+            # Utilizing time between two samples for windowing & amplitude calculation
+            sum1 += a  # To average value
+            if fixed_point:
+                sum2 += (a * a) >> 3  # To RMS value, / 8 keeps 1024 squares a small int
+                out[i] = (a * window_q[i]) >> 13  # Q15 Hann window, same scaling by 4
+            else:
+                sum2 += a * a  # To RMS value
+                a = a * window[i]  # Hann window
+                out[i] = int(4 * a)  # Scaling for float to int conversion
+
+        # Calculate amplitude
+        if fixed_point:
+            return isqrt((sum2 // n) << 3) - sum1 // n
+        sum1 = sum1 / n  # Average amplitude
+        sum2 = math.sqrt(sum2 / n)  # RMS amplitude
+        return sum2 - sum1
+
+    def fingerprint(self, frame=None):
+        """Autocorrelation of the middle of a loaded frame at FP_LAGS lags, times 256 of lag 0"""
+        if frame is None:
+            frame = self.frame
+        start = self.fp_start
+        stride = self.fp_stride
+        points = self.fp_span // stride
+        out = self.fp
+        # >> 2 undoes the load() scaling, so the FP_POINTS products stay small ints.
+        # The loops count instead of range(start, stop, stride): MicroPython only
+        # runs a range() loop without allocating when its step is a literal.
+        e = 0
+        i = start
+        for _ in range(points):
+            a = frame[i] >> 2
+            e += a * a
+            i += stride
+        for k in range(FP_LAGS):
+            lag = (k + 1) * self.fp_step
+            c = 0
+            i = start
+            for _ in range(points):
+                c += (frame[i] >> 2) * (frame[i + lag] >> 2)
+                i += stride
+            if e < 1 << 20:
+                out[k] = c * 256 // e if e else 0
+            else:
+                out[k] = c // (e >> 8)  # Same ratio, c * 256 could pass a small int
+        return out
+
+    def chroma(self, rate, frame=None):
+        """FFT, peaks and note mapping of a loaded frame, frame[0:12] becomes the chroma vector"""
+        if frame is None:
+            frame = self.frame
+        if self.fixed_point:
+            self.fft_q15(rate, frame)
+        else:
+            self.fft(rate, frame)
+
+        # Clear first 12 positions in input array
+        for i in range(12):
+            frame[i] = 0
+
+        note_table = self.note_table
+        note_table.update(rate)
+        table = note_table.table
+        scale = note_table.scale
+        last = len(table) - 1
+        f_peaks = self.f_peaks
+        positions = self.plan.positions
+
+        # Peaks this strong can be the bass, in magnitudes or with fixed_point in powers
+        in_ps = self.plan.peaks
+        if self.fixed_point:
+            mags = self.plan.power
+            floor = mags[in_ps[0]] // (BASS_LEVEL * BASS_LEVEL)
+        else:
+            mags = self.plan.out_r
+            floor = mags[in_ps[0]] / BASS_LEVEL
+
+        # Below loop will convert frequency value to note
+        low = last + 1  # Table position of the lowest strong note peak
+        for i in range(TOP_PEAKS):
+            if self.fixed_point:
+                k = positions[i]  # Already a table position
+            else:
+                k = int(f_peaks[i] * scale + 0.5)
+            if k > last:
+                continue
+            note = table[k]
+            if note != NO_NOTE:
+                frame[note] = frame[note] + (TOP_PEAKS - i)  # A note with max peaks (harmonic) with amplitude priority is selected
+                if k < low and mags[in_ps[i]] >= floor:
+                    low = k
+        self.bass = table[low] if low <= last else NO_BASS
+        self.timing.mark(NOTES)
+        return frame
+
+    def fft(self, frequency, inp):
+        """FFT of the N = plan.N samples of inp in the arrays of the plan, peaks into f_peaks"""
+        plan = self.plan
+        N = plan.N
+
+        # Calculate the levels
+        o = plan.o
+
+        # Arrays for FFT calculation
+        in_ps = plan.peaks  # Input for sequencing
+        out_r = plan.out_r  # Real part of transform
+        out_im = plan.out_im  # Imaginary part of transform
+
+        rev = plan.rev
+        cos_t = plan.cos_t
+        sin_t = plan.sin_t
+
+        if self.kernels:
+            self.kernels.fft(plan, inp, frequency)
+        else:
+            # Update input array as per bit reverse order
+            for i in range(N):
+                out_r[i] = inp[rev[i]]
+                out_im[i] = 0
+
+            # FFT calculation
+            for i in range(o):
+                i10 = 1 << i  # Overall values of sine cosine
+                i11 = N >> (i + 1)  # Loop with similar sine cosine
+                n1 = 0
+
+                for j in range(i10):
+                    c = cos_t[j * i11]  # Twiddle for angle -2*pi*j/(2 * i10)
+                    s = sin_t[j * i11]
+                    n1 = j
+
+                    for k in range(i11):
+                        tr = c * out_r[i10 + n1] - s * out_im[i10 + n1]
+                        ti = s * out_r[i10 + n1] + c * out_im[i10 + n1]
+
+                        out_r[n1 + i10] = out_r[n1] - tr
+                        out_r[n1] = out_r[n1] + tr
+
+                        out_im[n1 + i10] = out_im[n1] - ti
+                        out_im[n1] = out_im[n1] + ti
+
+                        n1 = n1 + i10 + i10
+
+            # Calculate amplitude from complex number
+            for i in range(N // 2):
+                out_r[i] = math.sqrt((out_r[i] * out_r[i]) + (out_im[i] * out_im[i]))
+                out_im[i] = (i * frequency) / N  # Frequency bin
+        self.timing.mark(FFT)
+
+        self.find_peaks(out_r, out_im, in_ps, N // 2)
+        self.timing.mark(PEAKS)
+
+    def fft_q15(self, frequency, inp):
+        """Integer FFT with Q15 twiddles, the peaks of fft() as note table positions in plan.positions.
+
+        Block floating point: the input is shifted up to 14 bits, and a stage
+        halves its outputs only when its inputs could otherwise grow past 15
+        bits, so every magnitude stays below 2**15 and every product is a
+        small int. plan.power holds the squared magnitudes times
+        2**(-2 * plan.exp). frequency is not needed, positions are in bins.
+        """
+        plan = self.plan
+        N = plan.N
+        o = plan.o
+        re = plan.re
+        im = plan.im
+        rev = plan.rev
+        cos_q = plan.cos_q
+        sin_q = plan.sin_q
+
+        half = N // 2
+        if self.kernels:
+            plan.exp = self.kernels.fft_q15(plan, inp)
+        else:
+            # Bit reversed input, normalized to 8192 <= max < 16384
+            peak = 0
+            for i in range(N):
+                x = inp[rev[i]]
+                re[i] = x
+                im[i] = 0
+                if x < 0:
+                    x = -x
+                if x > peak:
+                    peak = x
+            shift = 0
+            while peak and peak < 8192:
+                peak <<= 1
+                shift += 1
+            while peak >= 16384:
+                peak >>= 1
+                shift -= 1
+            if shift > 0:
+                for i in range(N):
+                    re[i] <<= shift
+            elif shift < 0:
+                for i in range(N):
+                    re[i] >>= -shift
+            exp = -shift
+
+            for i in range(o):
+                # |re| + |im| bounds the magnitude, below 2**14 the stage can double it safely
+                big = 0
+                for k in range(N):
+                    x = re[k]
+                    if x < 0:
+                        x = -x
+                    y = im[k]
+                    if y < 0:
+                        y = -y
+                    if x + y > big:
+                        big = x + y
+                h = 0
+                if big >= 16384:
+                    h = 1
+                    exp += 1
+
+                i10 = 1 << i
+                i11 = N >> (i + 1)
+                for j in range(i10):
+                    c = cos_q[j * i11]
+                    s = sin_q[j * i11]
+                    n1 = j
+                    for k in range(i11):
+                        n2 = n1 + i10
+                        br = re[n2]
+                        bi = im[n2]
+                        # Products are below 2**30, shifted one at a time so no sum can overflow a small int
+                        tr = ((c * br) >> 15) - ((s * bi) >> 15)
+                        ti = ((s * br) >> 15) + ((c * bi) >> 15)
+                        ar = re[n1]
+                        ai = im[n1]
+                        re[n2] = (ar - tr) >> h
+                        re[n1] = (ar + tr) >> h
+                        im[n2] = (ai - ti) >> h
+                        im[n1] = (ai + ti) >> h
+                        n1 += i10 + i10
+            plan.exp = exp
+
+            # Squared magnitudes, only N/2; they order the peaks like the magnitudes
+            power = plan.power
+            for i in range(half):
+                power[i] = re[i] * re[i] + im[i] * im[i]
+        self.timing.mark(FFT)
+
+        self.find_peaks_q15(plan.power, plan.peaks, half)
+        self.timing.mark(PEAKS)
+
+    def find_peaks(self, out_r, out_im, in_ps, half):
+        """Top 8 local maxima of the magnitudes out_r[0:half] into f_peaks, out_im holds the bin frequencies"""
+        f_peaks = self.f_peaks
+
+        # Peak detection
+        if self.kernels:
+            x = self.kernels.maxima(out_r, in_ps, half)
+        else:
+            x = 0
+            for i in range(1, half - 1):
+                if out_r[i] > out_r[i - 1] and out_r[i] > out_r[i + 1]:
+                    in_ps[x] = i  # in_ps array used for storage of peak number
+                    x = x + 1
+
+        # Rearrange as per magnitude
+        s = 0
+        c = 0
+        for i in range(x):
+            for j in range(c, x):
+                if out_r[in_ps[i]] < out_r[in_ps[j]]:
+                    s = in_ps[i]
+                    in_ps[i] = in_ps[j]
+                    in_ps[j] = s
+            c = c + 1
+
+        # Update f_peaks array with frequencies in descending order
+        for i in range(TOP_PEAKS):
+            if i < x:  # Make sure we have enough peaks
+                # Weighted average of peak and adjacent bins for better frequency resolution
+                f_peaks[i] = (out_im[in_ps[i] - 1] * out_r[in_ps[i] - 1] +
+                              out_im[in_ps[i]] * out_r[in_ps[i]] +
+                              out_im[in_ps[i] + 1] * out_r[in_ps[i] + 1]) / \
+                             (out_r[in_ps[i] - 1] + out_r[in_ps[i]] + out_r[in_ps[i] + 1])
+            else:
+                f_peaks[i] = 0
+
+
+    def find_peaks_q15(self, power, in_ps, half):
+        """Top 8 local maxima of power[0:half] as NOTE_STEPS per bin positions into plan.positions, 0 if none"""
+        positions = self.plan.positions
+
+        if self.kernels:
+            x = self.kernels.maxima_q15(power, in_ps, half)
+        else:
+            x = 0
+            for i in range(1, half - 1):
+                if power[i] > power[i - 1] and power[i] > power[i + 1]:
+                    in_ps[x] = i
+                    x += 1
+
+        # Strongest TOP_PEAKS first, by selection
+        for i in range(min(x, TOP_PEAKS)):
+            for j in range(i + 1, x):
+                if power[in_ps[i]] < power[in_ps[j]]:
+                    s = in_ps[i]
+                    in_ps[i] = in_ps[j]
+                    in_ps[j] = s
+
+        # Magnitude weighted average of the peak and its neighbour bins, as in find_peaks()
+        for i in range(TOP_PEAKS):
+            if i < x:
+                k = in_ps[i]
+                left = isqrt(power[k - 1])
+                centre = isqrt(power[k])
+                right = isqrt(power[k + 1])
+                total = left + centre + right
+                positions[i] = (NOTE_STEPS * (k * total + right - left) + total // 2) // total
+            else:
+                positions[i] = 0
+
+
+class ArrayBackend:
+    """The detection flow vectorized on ulab or host NumPy, np is the module.
+
+    Same API and results as PythonBackend up to float rounding: the same
+    window, peaks refined by the magnitude weighted average of their
+    neighbour bins and the same note table, just without Python loops.
+    """
+    fixed_point = False  # Float levels, the arrays are allocated per frame
+
+    def __init__(self, np, name, n, qualities=EXTENDED, timing=None):
+        self.np = np
+        self.name = name
+        self.n = n
+        self.note_table = NoteTable(n, NOTE_STEPS, np)
+        self.engine = ChordEngine(qualities, np)
+        self.timing = timing or StageTimer(STAGE_NAMES)
+        self.frame = self.new_frame()
+        # 4 * Hann window, the scaling of PythonBackend.load(), from the same single precision values
+        hann = array.array('f', [math.sin(i * math.pi / n) * math.sin(i * math.pi / n) for i in range(n)])
+        self.window = np.array([4 * w for w in hann])
+        self.peak_weights = np.array(list(range(TOP_PEAKS, 0, -1)))  # Stronger peaks get higher weight
+        self.pitch_classes = np.array([[i] for i in range(12)])  # Column vector for note binning
+        self.fp = array.array('i', [0] * FP_LAGS)
+        self.fp_start, self.fp_span, self.fp_stride, self.fp_step = fingerprint_shape(n)
+        self.bass = NO_BASS
+
+    def new_frame(self):
+        return self.np.zeros(self.n)
+
+    def load(self, buf, j, out=None):
+        """Hann windowed n read_u16() samples of buf from j on (wrapping) into out, returns RMS minus mean amplitude"""
+        np = self.np
+        if out is None:
+            out = self.frame
+        n = self.n
+        ring = np.frombuffer(buf, dtype=np.uint16)
+        if j + n <= len(buf):
+            x = ring[j:j + n]
+        else:
+            x = np.concatenate((ring[j:], ring[:j + n - len(buf)]))
+        x = np.floor(x / 16) - 2048  # Zero-centred 12-bit
+        level = math.sqrt(np.mean(x * x)) - np.mean(x)
+        # Truncated towards zero like int(4 * a) in PythonBackend.load(), floor and ceil as ulab has no trunc
+        x = x * self.window
+        out[:] = np.floor(x) * (x >= 0) + np.ceil(x) * (x < 0)
+        return level
+
+    def fingerprint(self, frame=None):
+        """Autocorrelation of the middle of a loaded frame at FP_LAGS lags, times 256 of lag 0"""
+        np = self.np
+        if frame is None:
+            frame = self.frame
+        start = self.fp_start
+        span = self.fp_span
+        stride = self.fp_stride
+        step = self.fp_step
+        out = self.fp
+        a = frame[start:start + span:stride]
+        e = np.sum(a * a)
+        for k in range(FP_LAGS):
+            lag = start + (k + 1) * step
+            out[k] = int(256 * np.sum(frame[lag:lag + span:stride] * a) / e) if e else 0
+        return out
+
+    def chroma(self, rate, frame=None):
+        """12 bin chroma vector of a loaded frame"""
+        np = self.np
+        timing = self.timing
+        if frame is None:
+            frame = self.frame
+        half = self.n // 2
+
+        # Compute FFT, only positive frequencies are kept
+        magnitudes = abs(np.fft.fft(frame)[:half])
+        timing.mark(FFT)
+
+        # Peak mask: local maxima
+        mid = magnitudes[1:half - 1]
+        strength = mid * ((mid > magnitudes[:half - 2]) * (mid > magnitudes[2:]))
+
+        # Top peaks, strongest first
+        top = np.argsort(strength)[-TOP_PEAKS:][::-1]
+        peak_mag = np.take(strength, top)
+        idx = top + 1  # Index into magnitudes
+
+        # Weighted average of the peak and its neighbour bins
+        left = np.take(magnitudes, idx - 1)
+        centre = np.take(magnitudes, idx)
+        right = np.take(magnitudes, idx + 1)
+        total = np.maximum(left + centre + right, 1e-6)
+        positions = (idx + (right - left) / total) * NOTE_STEPS
+        timing.mark(PEAKS)
+
+        # Octave folding and note binning through the bin-to-note table,
+        # positions outside the note range map to NO_NOTE and match no pitch class
+        note_table = self.note_table
+        note_table.update(rate)
+        last = len(note_table.table) - 1
+        positions = np.minimum(np.around(positions), last)
+        notes = np.take(note_table.array, np.array(positions, dtype=np.uint16))
+        weights = self.peak_weights * (peak_mag > 0)
+        chroma = np.sum((self.pitch_classes == notes) * weights, axis=1)
+
+        # Lowest strong peak that is a note, pushing the others past every position
+        weak = peak_mag * BASS_LEVEL < peak_mag[0]
+        low = int(np.argmin(positions + (last + 1) * ((notes > 11) + weak + (peak_mag <= 0))))
+        self.bass = int(notes[low]) if notes[low] < NO_NOTE and peak_mag[low] > 0 and not weak[low] else NO_BASS
+        timing.mark(NOTES)
+        return chroma
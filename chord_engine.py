@@ -0,0 +1,134 @@
+import math
+import array
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+# Chord types: name suffix and semitone intervals from the root
+CHORD_TYPES = {
+    '': (0, 4, 7),  # Major
+    'm': (0, 3, 7),  # Minor
+    '7': (0, 4, 7, 10),  # Dominant 7th
+    'maj7': (0, 4, 7, 11),  # Major 7th
+    'm7': (0, 3, 7, 10),  # Minor 7th
+    'sus2': (0, 2, 7),
+    'sus4': (0, 5, 7),
+    'dim': (0, 3, 6),
+    'aug': (0, 4, 8),
+    '5': (0, 7),  # Power chord
+}
+
+# Template sets, the order decides ties
+TRIADS = ('', 'm')
+EXTENDED = ('', 'm', '7', 'maj7', 'm7', 'sus2', 'sus4', 'dim', 'aug', '5')
+
+NO_BASS = -1  # Bass pitch class when no note was found
+BASS_LEVEL = 4  # The bass is the lowest note with 1/BASS_LEVEL of the strongest amplitude, weaker peaks are sidelobes
+
+
+class ChordEngine:
+    """Scores a 12 bin chroma vector against a chord template matrix.
+
+    Row r of the matrix is the chord with root r % 12 and type
+    qualities[r // 12]. Chord tones weigh 1 / sqrt(number of notes) so
+    chords with more notes only win when the extra notes are present.
+    Pass np (ulab numpy or host NumPy) to score with one matrix-vector
+    product, otherwise the sparse pure-Python path is used. With
+    fixed_point the pure-Python path works on integer chroma with the
+    weights times 256, so scoring allocates nothing.
+
+    Some chords have the same pitch classes: Csus4 is Fsus2 and C, E and
+    G#aug are one chord, so their scores always tie and only the first
+    name could win. index() takes the bass pitch class to choose between
+    them, the one rooted on the bass wins if there is one.
+    """
+
+    def __init__(self, qualities=EXTENDED, np=None, fixed_point=False):
+        self.qualities = qualities
+        self.np = np
+        self.fixed_point = fixed_point and np is None
+        self.intervals = [CHORD_TYPES[q] for q in qualities]
+        self.weights = [1 / math.sqrt(len(iv)) for iv in self.intervals]
+        self.names = [root + q for q in qualities for root in NOTE_NAMES]
+        self.score = 0  # Score of the last index() result, times 256 with fixed_point
+        self.score8 = 0  # The same score times 256 in either case, as an int
+
+        # by_bass[12 * r + b]: the chord with the notes of chord r rooted on pitch class b, r itself if none
+        masks = []  # Pitch classes of each chord, one bit each
+        for r in range(len(self.names)):
+            m = 0
+            for k in self.intervals[r // 12]:
+                m |= 1 << ((r + k) % 12)
+            masks.append(m)
+        self.by_bass = bytearray(12 * len(self.names))  # Fewer than 256 chords
+        for r in range(len(self.names)):
+            for b in range(12):
+                self.by_bass[12 * r + b] = r
+        for r in range(len(self.names)):
+            for t in range(len(self.names)):
+                if masks[t] == masks[r] and self.by_bass[12 * r + t % 12] == r and t % 12 != r % 12:
+                    self.by_bass[12 * r + t % 12] = t
+
+        if np is None:
+            self.matrix = None
+            if self.fixed_point:
+                self.weights = [int(256 * w + 0.5) for w in self.weights]
+                self.out = array.array('i', [0] * len(self.names))
+            else:
+                self.out = array.array('f', [0] * len(self.names))
+        else:
+            rows = []
+            for q in range(len(qualities)):
+                for root in range(12):
+                    row = [0.0] * 12
+                    for k in self.intervals[q]:
+                        row[(root + k) % 12] = self.weights[q]
+                    rows.append(row)
+            self.matrix = np.array(rows)
+
+    def scores(self, chroma):
+        """Score of every chord, in the order of names"""
+        if self.np is not None:
+            return self.np.dot(self.matrix, chroma)
+
+        out = self.out
+        r = 0
+        for q in range(len(self.intervals)):
+            iv = self.intervals[q]
+            w = self.weights[q]
+            for root in range(12):
+                s = 0
+                for k in iv:
+                    s += chroma[(root + k) % 12]
+                out[r] = s * w
+                r += 1
+        return out
+
+    def index(self, chroma, bass=NO_BASS):
+        """Index into names of the strongest chord; its score is left in score and score8.
+
+        Of chords with the same notes the one rooted on the bass pitch
+        class wins, otherwise the first one.
+        """
+        scores = self.scores(chroma)
+        if self.np is not None:
+            idx = int(self.np.argmax(scores))
+            self.score = float(scores[idx])
+        else:
+            idx = 0
+            for r in range(1, len(scores)):
+                if scores[r] > scores[idx]:
+                    idx = r
+            self.score = scores[idx]
+        self.score8 = self.score if self.fixed_point else int(self.score * 256)
+        if bass >= 0:
+            idx = self.by_bass[12 * idx + bass]
+        return idx
+
+    def best(self, chroma, bass=NO_BASS):
+        """Index into names and score of the strongest chord, ties as in index()"""
+        idx = self.index(chroma, bass)
+        return idx, self.score / 256 if self.fixed_point else self.score
+
+    def detect(self, chroma, bass=NO_BASS):
+        """Name of the strongest chord, e.g. 'C', 'Am', 'G7'"""
+        return self.names[self.best(chroma, bass)[0]]
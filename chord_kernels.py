@@ -0,0 +1,226 @@
+"""Native and viper builds of the hot loops of chord_core.PythonBackend.
+
+Only importable on MicroPython with the native emitters; chord_core
+falls back to its own bytecode loops otherwise. Each kernel computes
+exactly what the bytecode it replaces does, host/check_kernels.py
+compares them on the unix port:
+
+    micropython host/check_kernels.py
+
+The float kernels are @micropython.native, the same code compiled to
+machine code. The fixed-point ones are @micropython.viper on raw
+array pointers. ptr16 loads are unsigned, so 'h' values are sign
+extended by hand; ptr32 loads are zero extended on 64-bit ports, so
+'i' values go through (x ^ B) - B with B = 1 << 31, a no-op on the
+32-bit RP2040. Viper functions take at most four arguments, the tables
+come from the FFTPlan.
+"""
+import math
+import micropython
+
+
+@micropython.native
+def load(buf, j, out, plan):
+    """PythonBackend.load() in floats: Hann windowed samples of buf from j on into out, returns the level"""
+    window = plan.window
+    n = plan.N
+    m = len(buf)
+    sum1 = 0
+    sum2 = 0
+    for i in range(n):
+        a = buf[j] >> 4
+        j += 1
+        if j == m:
+            j = 0
+        a = a - 2048
+        sum1 += a
+        sum2 += a * a
+        a = a * window[i]
+        out[i] = int(4 * a)
+    sum1 = sum1 / n
+    sum2 = math.sqrt(sum2 / n)
+    return sum2 - sum1
+
+
+@micropython.viper
+def load_q15(buf, j: int, out, plan) -> int:
+    """PythonBackend.load() in fixed point, returns the integer level"""
+    src = ptr16(buf)
+    dst = ptr32(out)
+    window = ptr16(plan.window_q)  # 0 to 32767, the unsigned loads are exact
+    m = int(len(buf))
+    n = int(plan.N)
+    o = int(plan.o)
+    sum1 = 0
+    sum2 = 0
+    for i in range(n):
+        a = (src[j] >> 4) - 2048
+        j += 1
+        if j == m:
+            j = 0
+        sum1 += a
+        sum2 += (a * a) >> 3
+        dst[i] = (a * window[i]) >> 13
+
+    # isqrt() of the mean square times 8; n is 2**o, so >> o is // n
+    x = (sum2 >> o) << 3
+    r = 0
+    b = 1 << 28
+    while b > x:
+        b >>= 2
+    while b != 0:
+        if x >= r + b:
+            x -= r + b
+            r = (r >> 1) + b
+        else:
+            r >>= 1
+        b >>= 2
+    return r - (sum1 >> o)
+
+
+@micropython.native
+def fft(plan, inp, frequency):
+    """The float transform of PythonBackend.fft(): magnitudes into plan.out_r, bin frequencies into plan.out_im"""
+    N = plan.N
+    o = plan.o
+    out_r = plan.out_r
+    out_im = plan.out_im
+    rev = plan.rev
+    cos_t = plan.cos_t
+    sin_t = plan.sin_t
+
+    for i in range(N):
+        out_r[i] = inp[rev[i]]
+        out_im[i] = 0
+
+    for i in range(o):
+        i10 = 1 << i
+        i11 = N >> (i + 1)
+        for j in range(i10):
+            c = cos_t[j * i11]
+            s = sin_t[j * i11]
+            n1 = j
+            for k in range(i11):
+                tr = c * out_r[i10 + n1] - s * out_im[i10 + n1]
+                ti = s * out_r[i10 + n1] + c * out_im[i10 + n1]
+                out_r[n1 + i10] = out_r[n1] - tr
+                out_r[n1] = out_r[n1] + tr
+                out_im[n1 + i10] = out_im[n1] - ti
+                out_im[n1] = out_im[n1] + ti
+                n1 = n1 + i10 + i10
+
+    for i in range(N // 2):
+        out_r[i] = math.sqrt((out_r[i] * out_r[i]) + (out_im[i] * out_im[i]))
+        out_im[i] = (i * frequency) / N
+
+
+@micropython.viper
+def fft_q15(plan, inp) -> int:
+    """The block floating point transform of PythonBackend.fft_q15(): plan.re, im and power, returns plan.exp"""
+    n = int(plan.N)
+    o = int(plan.o)
+    re = ptr32(plan.re)
+    im = ptr32(plan.im)
+    power = ptr32(plan.power)
+    rev = ptr16(plan.rev)
+    cos_q = ptr16(plan.cos_q)
+    sin_q = ptr16(plan.sin_q)
+    src = ptr32(inp)
+    one = 1
+    B = one << 31  # Sign bit of an int32, shifted at run time so it is never a big int constant
+
+    # Bit reversed input, normalized to 8192 <= max < 16384
+    peak = 0
+    for i in range(n):
+        x = (src[rev[i]] ^ B) - B
+        re[i] = x
+        im[i] = 0
+        if x < 0:
+            x = 0 - x
+        if x > peak:
+            peak = x
+    shift = 0
+    while peak != 0 and peak < 8192:
+        peak <<= 1
+        shift += 1
+    while peak >= 16384:
+        peak >>= 1
+        shift -= 1
+    if shift > 0:
+        for i in range(n):
+            re[i] = re[i] << shift
+    elif shift < 0:
+        for i in range(n):
+            re[i] = ((re[i] ^ B) - B) >> (0 - shift)
+    exp = 0 - shift
+
+    for i in range(o):
+        big = 0
+        for k in range(n):
+            x = (re[k] ^ B) - B
+            if x < 0:
+                x = 0 - x
+            y = (im[k] ^ B) - B
+            if y < 0:
+                y = 0 - y
+            if x + y > big:
+                big = x + y
+        h = 0
+        if big >= 16384:
+            h = 1
+            exp += 1
+
+        i10 = one << i
+        i11 = n >> (i + 1)
+        for j in range(i10):
+            c = cos_q[j * i11]
+            if c > 32767:
+                c -= 65536
+            s = sin_q[j * i11]
+            if s > 32767:
+                s -= 65536
+            n1 = j
+            for k in range(i11):
+                n2 = n1 + i10
+                br = (re[n2] ^ B) - B
+                bi = (im[n2] ^ B) - B
+                tr = ((c * br) >> 15) - ((s * bi) >> 15)
+                ti = ((s * br) >> 15) + ((c * bi) >> 15)
+                ar = (re[n1] ^ B) - B
+                ai = (im[n1] ^ B) - B
+                re[n2] = (ar - tr) >> h
+                re[n1] = (ar + tr) >> h
+                im[n2] = (ai - ti) >> h
+                im[n1] = (ai + ti) >> h
+                n1 += i10 + i10
+
+    for i in range(n >> 1):
+        x = (re[i] ^ B) - B
+        y = (im[i] ^ B) - B
+        power[i] = x * x + y * y
+    return exp
+
+
+@micropython.native
+def maxima(mags, in_ps, half):
+    """Local maxima of mags[1:half - 1] into in_ps, returns their count (the scan of find_peaks())"""
+    x = 0
+    for i in range(1, half - 1):
+        if mags[i] > mags[i - 1] and mags[i] > mags[i + 1]:
+            in_ps[x] = i
+            x = x + 1
+    return x
+
+
+@micropython.viper
+def maxima_q15(power, in_ps, half: int) -> int:
+    """maxima() of the squared magnitudes of fft_q15(), below 2**30 so the ptr32 loads are exact"""
+    p = ptr32(power)
+    out = ptr16(in_ps)
+    x = 0
+    for i in range(1, half - 1):
+        v = p[i]
+        if v > p[i - 1] and v > p[i + 1]:
+            out[x] = i
+            x += 1
+    return x
@@ -0,0 +1,155 @@
+import math
+import array
+from chord_engine import NO_BASS, BASS_LEVEL
+from chord_core import LOW_C, RATE_TOLERANCE  # Lowest note of the bank, C2, and when to retune
+
+OCTAVES = 5  # C2 to B6, plus C7 (2093 Hz) on top
+Q = 17  # Cycles per filter block, about one semitone of resolution
+CHROMA_MAX = 36  # Strongest chroma bin, the total rank weight of the FFT path
+
+
+class GoertzelBank:
+    """Goertzel filters at every note from C2 to C7, producing chroma directly.
+
+    Each octave runs at its own sampling rate: the samples are halved in
+    rate (through a [1, 3, 3, 1] / 8 low pass against aliasing) once per
+    octave going down, so every filter sees its note at 0.2-0.4 of its
+    rate and each lower octave costs half as much as the one above.
+    Each filter integrates Q cycles of its note, so low notes resolve as
+    well as high ones, and reports its power when the block is complete;
+    feed() advances all filters by the new samples only.
+    """
+
+    def __init__(self, rate):
+        n = 12 * OCTAVES + 1
+        self.octave = bytearray(n)  # Filter group, 0 = lowest octave
+        self.coeff = array.array('f', [0] * n)  # 2 cos(w)
+        self.length = array.array('H', [0] * n)  # Block length in samples of its octave
+        self.s1 = array.array('f', [0] * n)
+        self.s2 = array.array('f', [0] * n)
+        self.count = array.array('H', [0] * n)
+        self.power = array.array('f', [0] * n)  # Last complete block, mean square amplitude
+        self.first = array.array('H', [0] * (OCTAVES + 1))  # Filters of octave o: first[o] to first[o + 1]
+        # Last three inputs and the output phase of each rate halving
+        self.h1 = array.array('f', [0] * OCTAVES)
+        self.h2 = array.array('f', [0] * OCTAVES)
+        self.h3 = array.array('f', [0] * OCTAVES)
+        self.phase = bytearray(OCTAVES)
+        self.bass = NO_BASS  # Pitch class of the lowest strong note at the last chroma()
+        self.overruns = 0  # Restarts after samples were lost between feeds
+        for k in range(n):
+            self.octave[k] = min(k // 12, OCTAVES - 1)
+        for o in range(OCTAVES + 1):
+            self.first[o] = 12 * o if o < OCTAVES else n
+        self.rate = 0
+        self.update(rate)
+
+    def update(self, rate):
+        """Retune the filters for a new sampling rate, a no-op while rate stays within tolerance"""
+        if self.rate and abs(rate - self.rate) <= RATE_TOLERANCE * self.rate:
+            return
+        self.rate = rate
+        for k in range(len(self.coeff)):
+            f = LOW_C * 2 ** (k / 12)
+            fs = rate / (1 << (OCTAVES - 1 - self.octave[k]))
+            self.coeff[k] = 2 * math.cos(2 * math.pi * f / fs)
+            self.length[k] = int(Q * fs / f + 0.5)
+            self.s1[k] = 0
+            self.s2[k] = 0
+            self.count[k] = 0
+            self.power[k] = 0
+
+    def reset(self):
+        """Clear the filters and rate halvings, for a restart after a gap in the samples.
+
+        The powers of the last complete blocks are kept until new blocks replace them.
+        """
+        for k in range(len(self.s1)):
+            self.s1[k] = 0
+            self.s2[k] = 0
+            self.count[k] = 0
+        for o in range(OCTAVES):
+            self.h1[o] = 0
+            self.h2[o] = 0
+            self.h3[o] = 0
+            self.phase[o] = 0
+
+    def _run(self, o, x):
+        # One sample through the filters of octave o
+        coeff = self.coeff
+        s1 = self.s1
+        s2 = self.s2
+        count = self.count
+        for k in range(self.first[o], self.first[o + 1]):
+            s = x + coeff[k] * s1[k] - s2[k]
+            s2[k] = s1[k]
+            s1[k] = s
+            count[k] += 1
+            if count[k] == self.length[k]:
+                n = self.length[k]
+                a = s1[k]
+                b = s2[k]
+                self.power[k] = (a * a + b * b - coeff[k] * a * b) / (n * n)
+                s1[k] = 0
+                s2[k] = 0
+                count[k] = 0
+
+    def feed(self, buf, j, count):
+        """Advance by count read_u16() samples of buf from j on (wrapping), returns their RMS minus mean amplitude"""
+        m = len(buf)
+        sum1 = 0
+        sum2 = 0
+        top = OCTAVES - 1
+        for i in range(count):
+            a = (buf[j] >> 4) - 2048  # 12-bit, zero-centred
+            j += 1
+            if j == m:
+                j = 0
+            sum1 += a
+            sum2 += a * a
+            x = a
+            self._run(top, x)
+            # Binary counter of rate halvings, one octave per bit
+            o = top
+            while o > 0:
+                h1 = self.h1[o]
+                h2 = self.h2[o]
+                h3 = self.h3[o]
+                self.h3[o] = h2
+                self.h2[o] = h1
+                self.h1[o] = x
+                if not self.phase[o]:
+                    self.phase[o] = 1
+                    break
+                self.phase[o] = 0
+                x = (x + 3 * (h1 + h2) + h3) / 8
+                o -= 1
+                self._run(o, x)
+        if not count:
+            return 0
+        return math.sqrt(sum2 / count) - sum1 / count
+
+    def chroma(self, out):
+        """Note energy folded to 12 pitch classes from C into out, as amplitudes scaled to CHROMA_MAX"""
+        for p in range(12):
+            out[p] = 0
+        strongest = 0
+        for k in range(len(self.power)):
+            out[k % 12] += self.power[k]  # Powers, so leakage into the other octaves adds little
+            if self.power[k] > strongest:
+                strongest = self.power[k]
+        self.bass = NO_BASS
+        for k in range(len(self.power)):
+            if strongest and self.power[k] * (BASS_LEVEL * BASS_LEVEL) >= strongest:  # Powers, so squared
+                self.bass = k % 12
+                break
+        for p in range(12):
+            out[p] = math.sqrt(out[p])
+        peak = 0
+        for p in range(12):
+            if out[p] > peak:
+                peak = out[p]
+        if peak:
+            for p in range(12):
+                out[p] = out[p] * CHROMA_MAX / peak
+        return out
@@ -0,0 +1,664 @@
+"""Speed and accuracy benchmark for the chord detectors, runs on Linux.
+
+Synthesized chords (with noise, detuning and inversions) are fed through
+chord-detection-pico.py (on the python and NumPy backends of chord_core,
+and with the Goertzel bank), chord-detection-pico-ulab.py and a port of
+the reference Chord_detection.txt algorithm using the stand-in machine and
+ulab modules from standins.py. Reports frames per second of host CPU
+time, time per stage and accuracy per chord type.
+
+    python host/bench_chords.py --frames 40 --noise 0.1 --detune 15 --inversions
+    python host/bench_chords.py --check-q15
+    python host/bench_chords.py --check-gate python
+    python host/bench_chords.py --check-alias
+"""
+import argparse
+import array
+import contextlib
+import io
+import math
+import random
+import sys
+import time
+
+import standins
+
+sys.path.insert(0, standins.REPO)
+from chord_engine import CHORD_TYPES, EXTENDED, NOTE_NAMES  # noqa: E402
+from uart_decode import Decoder  # noqa: E402
+import chord_core  # noqa: E402
+import goertzel_bank  # noqa: E402
+
+RATE = 5000  # Sampling rate the detectors run at, Hz
+N = 128
+AMPLITUDE = 600  # Peak amplitude of each note in ADC counts
+C0 = 16.352  # Chord roots are placed in the octave above C of --octave
+
+perf = time.perf_counter
+
+
+# ----------------------------------------------------------------------------
+# Test signals
+
+
+def chord_freqs(root, quality, inversion=0, detune=0.0, octave=3, rng=random):
+    """Note frequencies of a chord, inversion moves the lowest notes up an octave"""
+    base = C0 * 2 ** octave
+    freqs = [base * 2 ** ((root + k) / 12) for k in CHORD_TYPES[quality]]
+    for i in range(inversion % len(freqs)):
+        freqs[i] *= 2
+    if detune:
+        freqs = [f * 2 ** (rng.uniform(-detune, detune) / 1200) for f in freqs]
+    return freqs
+
+
+def make_signal(freqs, noise=0.0, harmonics=1, rng=random):
+    """Signal function t -> ADC counts for the given notes, random phases.
+
+    The noise is a fixed sequence over the RATE sample instants, drawn
+    from the signal's own generator on first use, so every variant that
+    plays the signal hears the same noise whatever order they run in.
+    """
+    parts = []
+    for f in freqs:
+        for h in range(1, harmonics + 1):
+            parts.append((2 * math.pi * f * h, rng.uniform(0, 2 * math.pi), AMPLITUDE / h))
+    noise_amp = noise * AMPLITUDE
+    noise_rng = random.Random(rng.getrandbits(32))
+    noise_at = []  # Noise of sample instant i
+
+    def signal(t):
+        v = 0.0
+        for w, phase, amp in parts:
+            v += amp * math.sin(w * t + phase)
+        if noise_amp:
+            i = int(round(t * RATE))
+            while len(noise_at) <= i:
+                noise_at.append(noise_rng.gauss(0, noise_amp))
+            v += noise_at[i]
+        return v
+
+    return signal
+
+
+# ----------------------------------------------------------------------------
+# Reference algorithm, a direct port of Chord_det() and FFT() in Chord_detection.txt
+
+NOTE_V = (8, 23, 40, 57, 76, 96, 116, 138, 162, 187, 213, 241, 255)
+
+
+def reference_fft(inp, frequency, f_peaks):
+    data = [1, 2, 4, 8, 16, 32, 64, 128]
+    o = 7
+    in_ps = [0] * 128
+    out_r = [0.0] * 128
+    out_im = [0.0] * 128
+
+    x = 0
+    for b in range(o):
+        c1 = data[b]
+        f = data[o] // (c1 + c1)
+        for j in range(c1):
+            x += 1
+            in_ps[x] = in_ps[j] + f
+    for i in range(128):
+        out_r[i] = inp[in_ps[i]]
+
+    for i in range(o):
+        i10 = data[i]
+        i11 = data[o] // data[i + 1]
+        e = -6.283 / data[i + 1]
+        for j in range(i10):
+            c = math.cos(e * j)
+            s = math.sin(e * j)
+            n1 = j
+            for k in range(i11):
+                tr = c * out_r[i10 + n1] - s * out_im[i10 + n1]
+                ti = s * out_r[i10 + n1] + c * out_im[i10 + n1]
+                out_r[n1 + i10] = out_r[n1] - tr
+                out_r[n1] = out_r[n1] + tr
+                out_im[n1 + i10] = out_im[n1] - ti
+                out_im[n1] = out_im[n1] + ti
+                n1 = n1 + i10 + i10
+
+    for i in range(64):
+        out_r[i] = math.sqrt(out_r[i] * out_r[i] + out_im[i] * out_im[i])
+        out_im[i] = i * frequency / 128
+
+    x = 0
+    for i in range(1, 63):
+        if out_r[i] > out_r[i - 1] and out_r[i] > out_r[i + 1]:
+            in_ps[x] = i
+            x += 1
+
+    c = 0
+    for i in range(x):
+        for j in range(c, x):
+            if out_r[in_ps[i]] < out_r[in_ps[j]]:
+                in_ps[i], in_ps[j] = in_ps[j], in_ps[i]
+        c += 1
+
+    # The Arduino code reads stale in_ps entries past x, this port uses 0
+    for i in range(8):
+        p = in_ps[i] if i < x else 0
+        if p == 0:
+            f_peaks[i] = 0
+            continue
+        f_peaks[i] = ((out_im[p - 1] * out_r[p - 1] + out_im[p] * out_r[p] + out_im[p + 1] * out_r[p + 1])
+                      / (out_r[p - 1] + out_r[p] + out_r[p + 1]))
+
+
+def reference_chord_det(samples, sampling, stages):
+    """samples are zero-centred ADC counts, returns the chord name or None"""
+    t0 = perf()
+    inp = [0] * 128
+    sum1 = 0
+    sum2 = 0
+    for i in range(128):
+        a = samples[i]
+        sum1 += a
+        sum2 += a * a
+        a = a * (math.sin(i * 3.14 / 128) * math.sin(i * 3.14 / 128))
+        inp[i] = int(4 * a)
+    sum1 = sum1 / 128
+    sum2 = math.sqrt(sum2 / 128)
+    if sum2 - sum1 <= 3:
+        stages['window'] += perf() - t0
+        return None
+
+    t1 = perf()
+    f_peaks = [0.0] * 8
+    reference_fft(inp, sampling, f_peaks)
+    t2 = perf()
+
+    inp = inp + [0] * 32  # in[] is read past 128 by the chord check
+    for i in range(12):
+        inp[i] = 0
+    for i in range(8):
+        f = f_peaks[i]
+        if f > 1040:
+            f = 0
+        if 65.4 <= f <= 130.8:
+            f = 255 * (f / 65.4 - 1)
+        if 130.8 <= f <= 261.6:
+            f = 255 * (f / 130.8 - 1)
+        if 261.6 <= f <= 523.25:
+            f = 255 * (f / 261.6 - 1)
+        if 523.25 <= f <= 1046:
+            f = 255 * (f / 523.25 - 1)
+        if f > 255:
+            f = 254
+        k = 0
+        while k < 13 and f > NOTE_V[k]:
+            k += 1
+        if k >= 12:
+            k = 0
+        inp[k] += 8 - i
+    t3 = perf()
+
+    k = 0
+    j = 0
+    for i in range(12):
+        if k < inp[i]:
+            k = inp[i]
+            j = i
+    for i in range(8):
+        inp[12 + i] = inp[i]
+    for i in range(12):
+        inp[20 + i] = inp[i] * inp[i + 4] * inp[i + 7]
+        inp[32 + i] = inp[i] * inp[i + 3] * inp[i + 7]
+    for i in range(24):
+        inp[i] = inp[i + 20]
+        if k < inp[i]:
+            k = inp[i]
+            j = i
+    t4 = perf()
+
+    stages['window'] += t1 - t0
+    stages['fft'] += t2 - t1
+    stages['notes'] += t3 - t2
+    stages['chord'] += t4 - t3
+    if j > 11:
+        return NOTE_NAMES[j - 12] + 'm'
+    return NOTE_NAMES[j]
+
+
+# ----------------------------------------------------------------------------
+# Variants, each run(signal) returns the detected chord name or None
+
+
+class Variant:
+    name = ''
+    stage_names = ()
+
+    def __init__(self):
+        self.stages = dict.fromkeys(self.stage_names, 0.0)
+        self.frames = 0
+        self.elapsed = 0.0
+
+    def run(self, signal):
+        raise NotImplementedError
+
+
+class Reference(Variant):
+    name = 'reference'
+    stage_names = ('capture', 'window', 'fft', 'notes', 'chord')
+
+    def run(self, signal):
+        t0 = perf()
+        samples = [int(signal(i / RATE)) for i in range(N)]
+        self.stages['capture'] += perf() - t0
+        return reference_chord_det(samples, RATE, self.stages)
+
+
+def _timed(fn, stages, key):
+    def wrapper(*args, **kw):
+        t0 = perf()
+        try:
+            return fn(*args, **kw)
+        finally:
+            stages[key] += perf() - t0
+    return wrapper
+
+
+class OpenGate(chord_core.FrameGate):
+    """The fixed GATE of the earlier detectors: every frame above it is analysed.
+
+    Trials are unrelated frames rather than a stream, which the noise
+    floor and the steady check of FrameGate are not made for.
+    """
+
+    def open(self, level):
+        return level > chord_core.GATE
+
+    def steady(self, level, fp):
+        return False
+
+
+def _last_chord(m):
+    """Name of the chord in the last result frame written to the module's UART"""
+    frames = Decoder().feed(m.uart.out)
+    m.uart.out = bytearray()
+    return m.backend.engine.names[frames[-1].chord] if frames else None
+
+
+class Pico(Variant):
+    """chord-detection-pico.py on a chord_core backend, the capture timer is driven by the benchmark"""
+    name = 'pico'
+    backend = 'python'
+    fixed_point = False
+    stage_names = ('capture', 'window', 'steady', 'chroma', 'chord')
+
+    def __init__(self):
+        Variant.__init__(self)
+        m = self.m = standins.load('chord-detection-pico.py')
+        m.gate = OpenGate()
+        m.backend = b = chord_core.select_backend(m.FFT_N, self.backend, EXTENDED, m.timing, self.fixed_point)
+        b.load = _timed(b.load, self.stages, 'window')
+        b.fingerprint = _timed(b.fingerprint, self.stages, 'steady')
+        b.chroma = _timed(b.chroma, self.stages, 'chroma')
+        b.engine.index = _timed(b.engine.index, self.stages, 'chord')
+
+    def run(self, signal):
+        m = self.m
+        standins.set_signal(signal)
+        capture = m.capture
+        capture.start()
+        t0 = perf()
+        for i in range(m.FFT_N):
+            standins.clock_us = i * 1000000 // RATE
+            standins.fire_timers()
+        self.stages['capture'] += perf() - t0
+        m.chord_det()
+        capture.stop()
+        return _last_chord(m)
+
+
+class PicoQ15(Pico):
+    """chord-detection-pico.py with FIXED_POINT, the integer frame path of the python backend"""
+    name = 'pico-q15'
+    fixed_point = True
+
+
+class PicoNumpy(Pico):
+    """chord-detection-pico.py on the host NumPy backend, same frames as pico"""
+    name = 'pico-numpy'
+    backend = 'numpy'
+
+
+class Ulab(Variant):
+    """chord-detection-pico-ulab.py on the NumPy backed ulab stand-in, the capture timer is driven by the benchmark"""
+    name = 'ulab'
+    stage_names = ('capture', 'fft', 'chord', 'other')
+
+    def __init__(self):
+        Variant.__init__(self)
+        unp = standins.install_ulab()
+        unp.fft = type(unp.fft)(fft=_timed(unp.fft.fft, self.stages, 'fft'))
+        self.m = standins.load('chord-detection-pico-ulab.py')
+        self.m.gate = OpenGate()
+        self.m.backend.engine.index = _timed(self.m.backend.engine.index, self.stages, 'chord')
+
+    def run(self, signal):
+        m = self.m
+        standins.set_signal(signal)
+        capture = m.capture
+        capture.start()
+        t0 = perf()
+        for i in range(m.N):
+            standins.clock_us = i * 1000000 // RATE
+            standins.fire_timers()
+        self.stages['capture'] += perf() - t0
+        before = self.stages['fft'] + self.stages['chord']
+        t0 = perf()
+        m.detect_chord()
+        t1 = perf()
+        capture.stop()
+        after = self.stages['fft'] + self.stages['chord']
+        self.stages['other'] += (t1 - t0) - (after - before)
+        return _last_chord(m)
+
+
+class Goertzel(Variant):
+    """chord-detection-pico.py with the Goertzel bank, streamed for SETTLE_S per trial.
+
+    The low octave filters need about a quarter second of signal, so each
+    trial feeds that many hops and counts as that many frames.
+    """
+    name = 'goertzel'
+    stage_names = ('capture', 'bank', 'chord')
+    SETTLE_S = 0.4
+
+    def __init__(self):
+        Variant.__init__(self)
+        self.m = standins.load('chord-detection-pico.py')
+        self.m.gate = OpenGate()
+        self.m.chroma = self.m.array.array('f', [0] * 12)
+        self.m.bank_engine = self.m.ChordEngine(EXTENDED)
+        self.hop = self.m.HOP or self.m.FFT_N
+        self.m.bank_engine.index = _timed(self.m.bank_engine.index, self.stages, 'chord')
+
+    def run(self, signal):
+        m = self.m
+        standins.set_signal(signal)
+        m.bank = m.GoertzelBank(RATE)  # Fresh filters, no energy from the previous trial
+        m.fed = -1
+        capture = m.capture
+        capture.start()
+        hops = int(self.SETTLE_S * RATE) // self.hop
+        tick = 0
+        for h in range(hops):
+            t0 = perf()
+            for i in range(m.FFT_N if h == 0 else self.hop):
+                standins.clock_us = tick * 1000000 // RATE
+                standins.fire_timers()
+                tick += 1
+            t1 = perf()
+            chord0 = self.stages['chord']
+            m.goertzel_det()
+            self.stages['capture'] += t1 - t0
+            self.stages['bank'] += perf() - t1 - (self.stages['chord'] - chord0)
+        capture.stop()
+        self.frames += hops - 1
+        return _last_chord(m)
+
+
+VARIANTS = {'reference': Reference, 'pico': Pico, 'pico-q15': PicoQ15, 'pico-numpy': PicoNumpy, 'ulab': Ulab, 'goertzel': Goertzel}
+
+
+# ----------------------------------------------------------------------------
+# Fixed-point check
+
+Q15_BOUND = 2e-3  # Max fft_q15() magnitude error, relative to the largest float magnitude
+
+
+def check_fixed_point(frames, seed):
+    """Runs fft() and fft_q15() of the python backend on the same windowed frames.
+
+    Returns the worst magnitude error relative to the spectrum peak, and
+    the fraction of frames where the strongest peak lands within one
+    note table step of the float one.
+    """
+    standins.install()
+    b = chord_core.PythonBackend(chord_core.pick_fft_size(0))
+    rng = random.Random(seed)
+    n = b.n
+    half = n // 2
+    frame = b.frame
+    b.note_table.update(RATE)
+    worst = 0.0
+    agree = 0
+    for _ in range(frames):
+        quality = rng.choice(EXTENDED)
+        freqs = chord_freqs(rng.randrange(12), quality, 0, 10, rng.randrange(2, 6), rng)
+        scale = rng.choice((0.03, 0.3, 1))  # Quiet to loud
+        signal = make_signal(freqs, 0.05, 2, rng)
+        buf = array.array('H', [max(0, min(4095, int(2048 + scale * signal(i / RATE)))) << 4 for i in range(n)])
+        b.load(buf, 0)
+
+        b.fft_q15(RATE, frame)
+        fixed = [math.sqrt(b.plan.power[i]) * 2.0 ** b.plan.exp for i in range(half)]
+        fixed_peak = b.plan.positions[0]
+
+        b.fft(RATE, frame)
+        ref = b.plan.out_r[:half]  # Float magnitudes
+
+        top = max(ref) or 1
+        worst = max(worst, max(abs(a - b) for a, b in zip(fixed, ref)) / top)
+        agree += abs(fixed_peak - b.f_peaks[0] * b.note_table.scale) <= 1
+    return worst, agree / frames
+
+
+# ----------------------------------------------------------------------------
+# Goertzel decimation check
+
+ALIAS_TONES = (2000, 2200, 2400, 2450, 2497)  # Hz, folded below 500 Hz by the first halving at RATE
+ALIAS_BOUND = 0.05  # Max RMS of such a tone after the first halving, relative to its own RMS
+ALIAS_SAMPLES = 4000
+
+
+def check_alias():
+    """Feeds tones just below RATE/2 to GoertzelBank, measures what the first halving lets through.
+
+    Returns (tone, leak) pairs, leak being the RMS of the samples handed to
+    the octave below relative to the tone's RMS. The [1, 3, 3, 1] / 8 low
+    pass has a triple zero at the input Nyquist rate; being that short it
+    still passes much of a tone just above RATE/4, which folds onto the
+    top of the octave below instead of onto its notes.
+    """
+    amplitude = 1000
+    below = goertzel_bank.OCTAVES - 2
+    results = []
+    for f in ALIAS_TONES:
+        bank = goertzel_bank.GoertzelBank(RATE)
+        seen = []
+        run = bank._run
+
+        def tap(o, x, run=run, seen=seen):
+            if o == below:
+                seen.append(x)
+            run(o, x)
+        bank._run = tap
+        buf = array.array('H', [int(2048 + amplitude * math.sin(2 * math.pi * f * i / RATE)) << 4
+                                for i in range(ALIAS_SAMPLES)])
+        bank.feed(buf, 0, len(buf))
+        seen = seen[8:]  # Past the filter's start
+        mean = sum(seen) / len(seen)
+        rms = math.sqrt(sum((x - mean) ** 2 for x in seen) / len(seen))
+        results.append((f, rms / (amplitude / math.sqrt(2))))
+    return results
+
+
+# ----------------------------------------------------------------------------
+# Frame gate check
+
+# (seconds, chord or None for silence) per script: chords after silence, one held far past the
+# ~15 s a rising noise floor would take to swallow it, and a start straight into sound
+GATE_SCRIPTS = {
+    'changes': ((0.5, None), (1.5, 0), (1.5, 1), (0.5, None), (1.5, 2)),
+    'held': ((0.5, None), (25, 0)),
+    'boot': ((3, 0), (0.5, None), (1.5, 1)),
+}
+GATE_ACCURACY = 0.9  # Least fraction of settled sounding frames FrameGate must get right in every script
+GATE_SETTLE_S = 0.25  # Frames this soon after a change are not scored, the window still holds the old sound
+
+
+def check_gate(backend, script, noise, seed):
+    """Streams silence and held chords of a GATE_SCRIPTS script through chord_det() with and without FrameGate.
+
+    Returns, for each, the frames skipped, reused and analysed, the
+    fraction of settled sounding frames reported as the right chord and
+    the host time spent in chord_det().
+    """
+    rng = random.Random(seed)
+    chords = []
+    for _ in range(3):
+        quality = rng.choice(EXTENDED)
+        root = rng.randrange(12)
+        chords.append((NOTE_NAMES[root] + quality, make_signal(chord_freqs(root, quality, 0, 0, 3, rng), noise, 2, rng)))
+    silence = make_signal([], noise, 1, rng)  # Just the noise, the same for both gates
+
+    results = []
+    for gate in (OpenGate(), chord_core.FrameGate()):
+        m = standins.load('chord-detection-pico.py')
+        m.backend = chord_core.select_backend(m.FFT_N, backend, EXTENDED, m.timing)
+        m.gate = gate
+        hop = m.HOP or m.FFT_N
+        counts = [0, 0, 0]  # Skipped, reused, analysed
+        right = scored = 0
+        elapsed = 0.0
+        tick = 0
+        t_end = 0.0
+        m.capture.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for seconds, chord in GATE_SCRIPTS[script]:
+                t_start = t_end
+                t_end += seconds
+                standins.set_signal(silence if chord is None else chords[chord][1])
+                while tick < t_end * RATE:
+                    for _ in range(m.FFT_N if tick == 0 else hop):
+                        standins.clock_us = tick * 1000000 // RATE
+                        standins.fire_timers()
+                        tick += 1
+                    held = gate.held
+                    analysed = m.timing.count[chord_core.FFT]
+                    t0 = perf()
+                    m.chord_det()
+                    elapsed += perf() - t0
+                    got = _last_chord(m)
+                    if got is None:
+                        counts[0] += 1
+                    elif m.timing.count[chord_core.FFT] == analysed and gate.held > held:
+                        counts[1] += 1
+                    else:
+                        counts[2] += 1
+                    if chord is not None and tick / RATE - t_start >= GATE_SETTLE_S:
+                        scored += 1
+                        right += got == chords[chord][0]
+        m.capture.stop()
+        results.append((type(gate).__name__, counts, right / scored, elapsed))
+    return results
+
+
+# ----------------------------------------------------------------------------
+
+
+def bench(variants, types, frames, noise, detune, inversions, harmonics, octave, seed):
+    rng = random.Random(seed)
+    trials = []
+    for quality in types:
+        for _ in range(frames):
+            root = rng.randrange(12)
+            inversion = rng.randrange(len(CHORD_TYPES[quality])) if inversions else 0
+            freqs = chord_freqs(root, quality, inversion, detune, octave, rng)
+            trials.append((quality, NOTE_NAMES[root] + quality, make_signal(freqs, noise, harmonics, rng)))
+
+    results = {}
+    for v in variants:
+        correct = dict.fromkeys(types, 0)
+        with contextlib.redirect_stdout(io.StringIO()):  # Detectors print every chord
+            for quality, expected, signal in trials:
+                t0 = perf()
+                got = v.run(signal)
+                v.elapsed += perf() - t0
+                v.frames += 1
+                if got == expected:
+                    correct[quality] += 1
+        results[v.name] = correct
+    return results
+
+
+def report(variants, results, types, frames):
+    print('%-10s %8s %10s  %s' % ('variant', 'fps', 'ms/frame', 'ms per stage'))
+    for v in variants:
+        per = 1000 / v.frames
+        stages = '  '.join('%s %.2f' % (k, t * per) for k, t in v.stages.items())
+        print('%-10s %8.1f %10.2f  %s' % (v.name, v.frames / v.elapsed, v.elapsed * per, stages))
+
+    print()
+    print('%-8s' % 'accuracy' + ''.join('%11s' % v.name for v in variants))
+    for quality in types:
+        row = '%-8s' % (quality or 'maj')
+        for v in variants:
+            row += '%10.0f%%' % (100 * results[v.name][quality] / frames)
+        print(row)
+    total = len(types) * frames
+    print('%-8s' % 'all' + ''.join('%10.0f%%' % (100 * sum(results[v.name].values()) / total) for v in variants))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--variants', default='reference,pico,ulab',
+                        help='comma separated, from %s' % ', '.join(VARIANTS))
+    parser.add_argument('--types', default=','.join(q or 'maj' for q in EXTENDED),
+                        help='chord types to synthesize, maj for major')
+    parser.add_argument('--frames', type=int, default=20, help='frames per chord type')
+    parser.add_argument('--noise', type=float, default=0.05, help='noise RMS relative to one note')
+    parser.add_argument('--detune', type=float, default=0.0, help='max random detuning per note in cents')
+    parser.add_argument('--inversions', action='store_true', help='use random chord inversions')
+    parser.add_argument('--harmonics', type=int, default=1, help='harmonics per note, 1 for pure tones')
+    parser.add_argument('--octave', type=int, default=3, help='octave of the chord roots, 3 starts at C3')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mem-free', type=int, default=standins.MEM_FREE,
+                        help='free heap reported to the detectors, chord-detection-pico.py sizes its FFT from it')
+    parser.add_argument('--check-q15', action='store_true',
+                        help='only cross-check the fixed-point FFT against the float one')
+    parser.add_argument('--check-alias', action='store_true',
+                        help='only check that the Goertzel bank rate halving rejects tones above its Nyquist rate')
+    parser.add_argument('--check-gate', metavar='BACKEND',
+                        help='only stream silence and held chords through chord-detection-pico.py on BACKEND, '
+                             'with and without the frame gate')
+    args = parser.parse_args(argv)
+    standins.MEM_FREE = args.mem_free
+
+    if args.check_q15:
+        worst, agree = check_fixed_point(args.frames * 10, args.seed)
+        print('fft_q15 max magnitude error %.5f of peak (bound %.5f), strongest peak agrees in %.0f%% of frames'
+              % (worst, Q15_BOUND, 100 * agree))
+        sys.exit(0 if worst <= Q15_BOUND else 1)
+
+    if args.check_alias:
+        results = check_alias()
+        for f, leak in results:
+            print('%5d Hz leaks %.4f into the octave below (bound %.2f)' % (f, leak, ALIAS_BOUND))
+        sys.exit(0 if max(leak for f, leak in results) <= ALIAS_BOUND else 1)
+
+    if args.check_gate:
+        print('%-8s %-10s %8s %7s %9s %9s %9s' % ('script', 'gate', 'skipped', 'reused', 'analysed', 'accuracy', 'seconds'))
+        worst = 1.0
+        for script in GATE_SCRIPTS:
+            for name, counts, accuracy, elapsed in check_gate(args.check_gate, script, args.noise, args.seed):
+                print('%-8s %-10s %8d %7d %9d %8.0f%% %9.2f' % ((script, name) + tuple(counts) + (100 * accuracy, elapsed)))
+                if name == 'FrameGate':
+                    worst = min(worst, accuracy)
+        sys.exit(0 if worst >= GATE_ACCURACY else 1)
+
+    types = ['' if q == 'maj' else q for q in args.types.split(',')]
+    variants = [VARIANTS[name]() for name in args.variants.split(',')]
+    results = bench(variants, types, args.frames, args.noise, args.detune,
+                    args.inversions, args.harmonics, args.octave, args.seed)
+    report(variants, results, types, args.frames)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Checks the chord_kernels builds against the bytecode loops of PythonBackend.
+
+Runs on the MicroPython unix port (built with the native emitters):
+
+    micropython host/check_kernels.py
+
+Feeds the same pseudo random chords through PythonBackend with and
+without the kernels, float and fixed point, at N = 128 and 1024, and
+requires identical levels, frames, spectra, peaks and note bins. Prints
+the time of each and the speedup, exits 1 on any difference.
+"""
+import array
+import math
+import sys
+import time
+
+sys.path.insert(0, (__file__.rpartition('/')[0] or '.') + '/..')
+import chord_core  # noqa: E402
+
+RATE = 5000
+FRAMES = 20
+FREQS = (130.8, 164.8, 196.0, 261.6, 311.1, 392.0, 466.2)  # Cycled through, three notes a frame
+
+
+class Rng:
+    """Linear congruential generator, the unix port has no random.gauss"""
+
+    def __init__(self, seed=1):
+        self.x = seed
+
+    def next(self):
+        self.x = (self.x * 1103515245 + 12345) & 0x7fffffff
+        return self.x
+
+    def noise(self, amp):
+        return (self.next() % (2 * amp + 1)) - amp
+
+
+def fill(ring, f, rng, scale):
+    """Three notes from FREQS[f:] plus noise, as read_u16() samples"""
+    w = [2 * math.pi * FREQS[(f + k) % len(FREQS)] / RATE for k in range(3)]
+    for i in range(len(ring)):
+        s = sum(math.sin(x * i) for x in w) * 500 * scale + rng.noise(40)
+        ring[i] = max(0, min(4095, int(2048 + s))) << 4
+
+
+def results(b, level, chroma, fixed):
+    """Everything the kernels write for the frame b just analysed"""
+    plan = b.plan
+    if fixed:
+        spectrum = list(plan.power) + [plan.exp]
+        peaks = list(plan.positions)
+    else:
+        half = b.n // 2
+        spectrum = list(plan.out_r[:half]) + list(plan.out_im[:half])
+        peaks = list(b.f_peaks)
+    return (level, list(b.frame), spectrum, peaks, list(chroma))
+
+
+def check(n, fixed):
+    """Compares the two builds at n, returns the times in us of each"""
+    plain = chord_core.PythonBackend(n, fixed_point=fixed, native=False)
+    fast = chord_core.PythonBackend(n, fixed_point=fixed)
+    times = [0, 0]
+    bad = 0
+    for frame in range(FRAMES):
+        rng = Rng(frame + 1)
+        ring = array.array('H', [0] * n)
+        fill(ring, frame, rng, (0.05, 0.5, 1.5)[frame % 3])
+        j = (frame * 37) % n  # Wrapping reads
+        out = []
+        for k, b in enumerate((plain, fast)):
+            t = time.ticks_us()
+            level = b.load(ring, j)
+            chroma = b.chroma(RATE)  # FFT, peaks and note bins of the loaded frame
+            times[k] += time.ticks_diff(time.ticks_us(), t)
+            out.append(results(b, level, chroma, fixed))
+        for name, a, c in zip(('level', 'frame', 'spectrum', 'peaks', 'chroma'), *out):
+            if a != c:
+                print('n=%d fixed=%s frame %d: %s differs' % (n, fixed, frame, name))
+                bad += 1
+    return times, bad
+
+
+def main():
+    if chord_core.chord_kernels is None:
+        print('chord_kernels not available, needs MicroPython with the native emitters')
+        sys.exit(2)
+    bad = 0
+    print('    n  path     bytecode us   kernels us  speedup')
+    for n in (128, 1024):
+        for fixed in (False, True):
+            times, b = check(n, fixed)
+            bad += b
+            print('%5d  %-5s %14d %12d %7.1fx' % (n, 'q15' if fixed else 'float',
+                                                 times[0], times[1], times[0] / max(1, times[1])))
+    if bad:
+        print('%d differences' % bad)
+        sys.exit(1)
+    print('identical')
+
+
+main()
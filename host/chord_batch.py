@@ -0,0 +1,217 @@
+"""Offline chord analysis of WAV or raw PCM recordings, runs on Linux.
+
+Applies the chord_det() algorithm of chord-detection-pico.py (Hann
+window, amplitude gate, FFT, top 8 peaks, note table, chord templates)
+to whole recordings. Files are memory-mapped, decimated to about the
+Pico sampling rate and analysed many frames at a time with NumPy. Each
+file gets a chord track of "start<TAB>end<TAB>chord" lines in seconds,
+N marks frames below the amplitude gate.
+
+    python host/chord_batch.py session1.wav session2.wav --out-dir tracks
+    python host/chord_batch.py take.raw --raw-rate 48000 --raw-format s16 --raw-channels 2
+"""
+import argparse
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chord_engine import ChordEngine, EXTENDED, TRIADS, BASS_LEVEL  # noqa: E402
+from chord_core import GATE, NO_NOTE, NOTE_STEPS, TOP_PEAKS, NoteTable  # noqa: E402
+
+BLOCK_FRAMES = 4096  # Frames analysed per NumPy batch, bounds memory use
+
+RAW_FORMATS = {'u8': np.uint8, 's16': np.int16, 's32': np.int32, 'f32': np.float32}
+
+
+# ----------------------------------------------------------------------------
+# Input
+
+
+def open_wav(path):
+    """Memory-map the data chunk of a PCM or float WAV file, returns (samples, rate)"""
+    with open(path, 'rb') as f:
+        riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError('%s: not a WAV file' % path)
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError('%s: no data chunk' % path)
+            cid, size = struct.unpack('<4sI', header)
+            if cid == b'fmt ':
+                fmt = struct.unpack('<HHIIHH', f.read(16))
+                f.seek(size - 16 + (size & 1), 1)
+            elif cid == b'data':
+                offset = f.tell()
+                break
+            else:
+                f.seek(size + (size & 1), 1)
+    if fmt is None:
+        raise ValueError('%s: no fmt chunk' % path)
+
+    tag, channels, rate, _, _, bits = fmt
+    if tag == 3 and bits == 32:
+        dtype = np.float32
+    elif tag in (1, 0xFFFE) and bits in (8, 16, 32):
+        dtype = {8: np.uint8, 16: np.int16, 32: np.int32}[bits]
+    else:
+        raise ValueError('%s: unsupported WAV format %d with %d bits' % (path, tag, bits))
+    frames = min(size, os.path.getsize(path) - offset) // (channels * bits // 8)
+    data = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(frames, channels))
+    return data, rate
+
+
+def open_raw(path, rate, fmt, channels):
+    """Memory-map a headerless little-endian PCM file, returns (samples, rate)"""
+    dtype = np.dtype(RAW_FORMATS[fmt]).newbyteorder('<')
+    frames = os.path.getsize(path) // (dtype.itemsize * channels)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(frames, channels)), rate
+
+
+def to_adc(block, dtype):
+    """Mix to mono and scale to the zero-centred 12-bit counts chord_det() works on"""
+    x = block.astype(np.float32).mean(axis=1)
+    if dtype == np.uint8:
+        return (x - 128) * 16
+    if dtype == np.float32:
+        return x * 2048
+    return x * (2048 / 2 ** (8 * np.dtype(dtype).itemsize - 1))
+
+
+# ----------------------------------------------------------------------------
+# Detection, vectorized over frames
+
+
+class BatchDetector:
+    """chord_det() over a (frames, n) matrix of samples at a given rate"""
+
+    def __init__(self, n, rate, qualities=EXTENDED):
+        self.n = n
+        self.rate = rate
+        self.window = np.sin(np.arange(n) * np.pi / n) ** 2
+        self.engine = ChordEngine(qualities, np)
+        self.names = self.engine.names + ['N']
+        self.by_bass = np.frombuffer(bytes(self.engine.by_bass), np.uint8).reshape(-1, 12)  # As in index()
+
+        # Bin-to-note table of the detectors, the note range and steps come from chord_core
+        note_table = NoteTable(n, NOTE_STEPS)
+        note_table.update(rate)
+        self.table = np.frombuffer(bytes(note_table.table), np.uint8).astype(np.int64)
+
+    def detect(self, frames):
+        """Index into self.names per frame, the last name (N) when gated"""
+        n = self.n
+        half = n // 2
+        x = np.trunc(frames)  # chord_det() works on whole ADC counts
+        mean = x.mean(axis=1)
+        rms = np.sqrt((x * x).mean(axis=1))
+        gate = rms - mean > GATE
+
+        mag = np.abs(np.fft.fft(np.trunc(4 * x * self.window), axis=1)[:, :half])
+
+        # Local maxima, strongest TOP_PEAKS per frame
+        mid = mag[:, 1:half - 1]
+        strength = np.where((mid > mag[:, :half - 2]) & (mid > mag[:, 2:]), mid, 0)
+        order = np.argsort(-strength, axis=1, kind='stable')[:, :TOP_PEAKS]
+        peak = order + 1
+        peak_mag = np.take_along_axis(strength, order, axis=1)
+        present = peak_mag > 0
+
+        # Weighted average of the peak and its neighbours, in bins
+        m = [np.take_along_axis(mag, peak + d, axis=1) for d in (-1, 0, 1)]
+        total = m[0] + m[1] + m[2]
+        pos = (m[0] * (peak - 1) + m[1] * peak + m[2] * (peak + 1)) / np.where(total > 0, total, 1)
+
+        notes = self.table[np.minimum(np.rint(pos * NOTE_STEPS).astype(np.int64), len(self.table) - 1)]
+        weights = (TOP_PEAKS - np.arange(TOP_PEAKS)) * present * (notes != NO_NOTE)
+        chroma = np.zeros((len(frames), 13))
+        np.add.at(chroma, (np.arange(len(frames))[:, None], notes), weights)
+
+        best = np.argmax(chroma[:, :12] @ self.engine.matrix.T, axis=1)
+
+        # Chords with the same notes go to the one rooted on the lowest strong note peak
+        note = present & (notes != NO_NOTE) & (peak_mag * BASS_LEVEL >= peak_mag[:, :1])
+        low = np.argmin(np.where(note, pos, np.inf), axis=1)[:, None]
+        bass = np.take_along_axis(notes, low, axis=1)[:, 0]
+        has_bass = np.take_along_axis(note, low, axis=1)[:, 0]
+        best = np.where(has_bass, self.by_bass[best, np.minimum(bass, 11)], best)
+        return np.where(gate, best, len(self.names) - 1)
+
+
+def analyse(path, args):
+    """Chord track of one file as a list of (start, end, name) segments"""
+    if args.raw_rate:
+        data, rate = open_raw(path, args.raw_rate, args.raw_format, args.raw_channels)
+    else:
+        data, rate = open_wav(path)
+
+    factor = max(1, int(round(rate / args.rate)))
+    eff_rate = rate / factor
+    n = args.window
+    hop = args.hop or n
+    det = BatchDetector(n, eff_rate, TRIADS if args.triads else EXTENDED)
+
+    segments = []
+    span = (BLOCK_FRAMES - 1) * hop + n  # Decimated samples per batch
+    usable = len(data) // factor
+    start = 0
+    while start + n <= usable:
+        stop = min(start + span, usable)
+        block = to_adc(data[start * factor:stop * factor], data.dtype)
+        if factor > 1:
+            block = block.reshape(-1, factor).mean(axis=1)  # Box filter and decimate
+        frames = np.lib.stride_tricks.sliding_window_view(block, n)[::hop]
+        for i, idx in enumerate(det.detect(frames)):
+            t = (start + i * hop) / eff_rate
+            name = det.names[idx]
+            if segments and segments[-1][2] == name:
+                segments[-1][1] = t + hop / eff_rate
+            else:
+                segments.append([t, t + hop / eff_rate, name])
+        start += len(frames) * hop
+    return [tuple(s) for s in segments]
+
+
+def run_file(path, args):
+    segments = analyse(path, args)
+    lines = ['%.3f\t%.3f\t%s' % s for s in segments]
+    if args.out_dir:
+        out = os.path.join(args.out_dir, os.path.splitext(os.path.basename(path))[0] + '.chords.txt')
+        with open(out, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path, out
+    return path, '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--window', type=int, default=128, help='samples per analysis window')
+    parser.add_argument('--hop', type=int, default=0, help='samples between windows, default one window')
+    parser.add_argument('--rate', type=float, default=5000, help='analysis sampling rate, input is decimated to it')
+    parser.add_argument('--triads', action='store_true', help='only detect major and minor chords')
+    parser.add_argument('--raw-rate', type=int, default=0, help='treat inputs as raw PCM at this rate')
+    parser.add_argument('--raw-format', default='s16', choices=sorted(RAW_FORMATS))
+    parser.add_argument('--raw-channels', type=int, default=1)
+    parser.add_argument('--out-dir', help='write <name>.chords.txt here instead of printing')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    args = parser.parse_args(argv)
+
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for path, result in pool.map(run_file, args.files, [args] * len(args.files)):
+            if args.out_dir:
+                print('%s -> %s' % (path, result))
+            else:
+                print('# %s' % path)
+                print(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""Stand-ins for the MicroPython modules the Pico scripts import.
+
+Lets chord-detection-pico.py and chord-detection-pico-ulab.py run under
+CPython on Linux. Time is virtual: sleep_us() and ADC reads advance a
+microsecond clock, and the ADC returns the current signal at that clock,
+so the detectors see the sampling rate they would on the board.
+"""
+import os
+import sys
+import time
+import types
+import importlib.util
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ADC_READ_US = 5  # Virtual cost of one read_u16(), 195 us sleep + 5 us = 5 kHz
+MEM_FREE = 180000  # What gc.mem_free() reports, about a freshly booted Pico
+
+clock_us = 0  # Virtual microsecond clock
+signal = None  # Callable t (seconds) -> sample in ADC counts, zero-centred
+
+
+def set_signal(fn):
+    """Route fn(t) to every stand-in ADC, t in seconds"""
+    global signal
+    signal = fn
+
+
+def advance(us):
+    global clock_us
+    clock_us += us
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=None, pull=None, value=0):
+        self.id = id
+        self._value = value
+        self.handler = None
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = v
+
+    def irq(self, handler=None, trigger=None):
+        self.handler = handler
+
+
+class ADC:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def read_u16(self):
+        v = 2048
+        if signal is not None:
+            v += signal(clock_us / 1000000)
+        advance(ADC_READ_US)
+        v = int(v)
+        if v < 0:
+            v = 0
+        elif v > 4095:
+            v = 4095
+        return v << 4
+
+
+class UART:
+    """Keeps what was written, take_lines() returns it as text lines"""
+
+    def __init__(self, id, baudrate=9600, **kw):
+        self.id = id
+        self.out = bytearray()
+        self.rx = bytearray()
+
+    def init(self, *args, **kw):
+        pass
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.out += data
+        return len(data)
+
+    def any(self):
+        return len(self.rx)
+
+    def read(self, n=None):
+        if not self.rx:
+            return None
+        n = len(self.rx) if n is None else n
+        data = bytes(self.rx[:n])
+        self.rx = self.rx[n:]
+        return data
+
+    def readinto(self, buf, n=None):
+        data = self.read(len(buf) if n is None else n)
+        if not data:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take_lines(self):
+        lines = self.out.decode().splitlines()
+        self.out = bytearray()
+        return lines
+
+
+timers = []  # Running stand-in timers
+
+
+class Timer:
+    """Never fires on its own, fire_timers() drives the running ones"""
+    PERIODIC = 1
+    ONE_SHOT = 0
+
+    def __init__(self, id=-1):
+        self.callback = None
+        self.freq = 0
+
+    def init(self, freq=0, mode=PERIODIC, callback=None, period=None):
+        self.freq = freq
+        self.callback = callback
+        if self not in timers:
+            timers.append(self)
+
+    def deinit(self):
+        self.callback = None
+        if self in timers:
+            timers.remove(self)
+
+
+def fire_timers():
+    """Run the callback of every running timer once"""
+    for t in list(timers):
+        if t.callback is not None:
+            t.callback(t)
+
+
+def idle():
+    pass
+
+
+def _sleep_us(us):
+    advance(us)
+
+
+def install_time():
+    """Add the MicroPython ticks/sleep functions to the time module, on the virtual clock"""
+    time.ticks_us = lambda: clock_us
+    time.ticks_ms = lambda: clock_us // 1000
+    time.ticks_diff = lambda a, b: a - b
+    time.ticks_add = lambda a, b: a + b
+    time.sleep_us = _sleep_us
+    time.sleep_ms = lambda ms: _sleep_us(ms * 1000)
+
+
+def install_gc():
+    """Add gc.mem_free() and gc.mem_alloc(), mem_free() reports MEM_FREE"""
+    import gc
+    gc.mem_free = lambda: MEM_FREE
+    gc.mem_alloc = lambda: 0
+
+
+def install_machine():
+    machine = types.ModuleType('machine')
+    for name in ('Pin', 'ADC', 'UART', 'Timer', 'idle'):
+        setattr(machine, name, globals()[name])
+    machine.freq = lambda *a: 125000000
+    sys.modules['machine'] = machine
+    return machine
+
+
+def install_ulab(np=None):
+    """ulab stand-in backed by NumPy, returns the ulab.numpy namespace"""
+    if np is None:
+        import numpy as np
+    ulab = types.ModuleType('ulab')
+    unp = types.ModuleType('ulab.numpy')
+    unp.__dict__.update({k: v for k, v in np.__dict__.items() if not k.startswith('__')})
+    unp.fft = types.SimpleNamespace(fft=np.fft.fft, ifft=np.fft.ifft)
+    ulab.numpy = unp
+    ulab.utils = types.ModuleType('ulab.utils')
+    sys.modules['ulab'] = ulab
+    sys.modules['ulab.numpy'] = unp
+    sys.modules['ulab.utils'] = ulab.utils
+    return unp
+
+
+def install():
+    install_time()
+    install_gc()
+    install_machine()
+    if REPO not in sys.path:
+        sys.path.insert(0, REPO)
+
+
+def load(filename, name=None):
+    """Import one of the repo scripts by file name, e.g. 'chord-detection-pico.py'"""
+    install()
+    path = os.path.join(REPO, filename)
+    spec = importlib.util.spec_from_file_location(name or filename[:-3].replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
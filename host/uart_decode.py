@@ -0,0 +1,132 @@
+"""Decoder for the binary result frames of the chord detectors, runs on Linux.
+
+Reads the UART stream of chord-detection-pico.py or
+chord-detection-pico-ulab.py (frame layout in result_frame.py) from a
+serial port, a capture file or stdin, checks sync and CRC, resynchronises
+after garbage (e.g. the text of a 't' timing report) and reports frames
+lost in transit from the sequence numbers.
+
+    python host/uart_decode.py /dev/ttyACM0 --baud 250000
+    python host/uart_decode.py capture.bin --notes
+"""
+import argparse
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chord_engine import ChordEngine, EXTENDED, TRIADS  # noqa: E402
+from result_frame import (FLAG_NOTES, HEADER, HEADER_SIZE, NO_CHORD, SIZE, SIZE_NOTES,  # noqa: E402
+                          SYNC, crc16)
+
+
+class Frame:
+    __slots__ = ('seq', 'ticks', 'chord', 'score', 'notes')
+
+    def __init__(self, seq, ticks, chord, score, notes):
+        self.seq = seq
+        self.ticks = ticks  # ms, device clock
+        self.chord = chord  # Index into the engine names, NO_CHORD if none
+        self.score = score
+        self.notes = notes  # 12 note weights from C, or None
+
+
+class Decoder:
+    """Incremental frame parser, feed() it bytes as they arrive"""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.last_seq = None
+        self.frames = 0
+        self.dropped = 0  # Frames missing from the sequence numbers
+        self.crc_errors = 0
+        self.skipped = 0  # Bytes discarded while looking for sync
+
+    def feed(self, data):
+        """Append data, returns the list of complete valid frames"""
+        buf = self.buf
+        buf += data
+        out = []
+        while True:
+            i = buf.find(SYNC)
+            if i < 0:
+                self.skipped += len(buf)
+                del buf[:]
+                break
+            if i:
+                self.skipped += i
+                del buf[:i]
+            if len(buf) < HEADER_SIZE:
+                break
+            size = SIZE_NOTES if buf[2] & FLAG_NOTES else SIZE
+            if buf[2] & ~FLAG_NOTES:
+                self.skipped += 1  # Unknown flags, not a frame start
+                del buf[:1]
+                continue
+            if len(buf) < size:
+                break
+            crc = buf[size - 2] | buf[size - 1] << 8
+            if crc16(buf, 1, size - 2) != crc:
+                self.crc_errors += 1
+                self.skipped += 1
+                del buf[:1]  # Maybe a sync byte inside other data, look again from the next byte
+                continue
+            _, seq, flags, chord, ticks, score = struct.unpack_from(HEADER, buf)
+            notes = list(buf[HEADER_SIZE:HEADER_SIZE + 12]) if flags & FLAG_NOTES else None
+            del buf[:size]
+            if self.last_seq is not None:
+                self.dropped += (seq - self.last_seq - 1) & 0xFF
+            self.last_seq = seq
+            self.frames += 1
+            out.append(Frame(seq, ticks, chord, score / 256, notes))
+        return out
+
+
+def open_stream(path, baud):
+    """Binary file object for a serial port, a capture file or - for stdin"""
+    if path == '-':
+        return sys.stdin.buffer
+    if path.startswith('/dev/') or path.upper().startswith('COM'):
+        try:
+            import serial
+        except ImportError:
+            sys.exit('reading a serial port needs pyserial (pip install pyserial)')
+        return serial.Serial(path, baud, timeout=0.1)
+    return open(path, 'rb')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('source', help='serial port, capture file or - for stdin')
+    parser.add_argument('--baud', type=int, default=250000)
+    parser.add_argument('--triads', action='store_true', help='detector was built with TRIADS')
+    parser.add_argument('--notes', action='store_true', help='print the note bins too')
+    args = parser.parse_args(argv)
+
+    names = ChordEngine(TRIADS if args.triads else EXTENDED).names
+    decoder = Decoder()
+    stream = open_stream(args.source, args.baud)
+    try:
+        while True:
+            data = stream.read(256)
+            if not data:
+                if hasattr(stream, 'port'):
+                    continue  # Serial timeout, keep listening
+                break
+            dropped = decoder.dropped
+            for f in decoder.feed(data):
+                name = '-' if f.chord == NO_CHORD else names[f.chord] if f.chord < len(names) else '?%d' % f.chord
+                line = '%3d %10d %-6s %7.2f' % (f.seq, f.ticks, name, f.score)
+                if args.notes and f.notes is not None:
+                    line += '  ' + ' '.join('%3d' % n for n in f.notes)
+                print(line)
+            if decoder.dropped != dropped:
+                print('# %d frames dropped so far' % decoder.dropped, file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    print('# %d frames, %d dropped, %d CRC errors, %d bytes skipped'
+          % (decoder.frames, decoder.dropped, decoder.crc_errors, decoder.skipped), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
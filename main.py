@@ -1,33 +1,57 @@
 
 #Libraries for Potentiometer
-from machine import ADC, Pin
+import machine
+from machine import Pin
+import adc_scanner
 import time
+import array
 
 import random
 
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
 #Libraries For LCD
 from machine import I2C, Pin
-from time import sleep
 from pico_i2c_lcd import I2cLcd
 
 ##POT FUNCTION
-# Define a function to map a value from one range to another
-def map_value(x, in_min, in_max, out_min, out_max):
-    return (x - in_min) * (out_max - out_min) / (in_max - in_min) + out_min
+FULL_SCALE_MV = 3300  # ADC reference, 4095 counts
+
+class Pot:
+    """Filtered pot reading in millivolts.
+
+    The scanner channel holds burst-averaged samples; read() takes the
+    moving average of the last taps of them and only reports a new value
+    once it moves more than hysteresis mV away from the reported one, so
+    ADC noise does not flicker the reading.
+    """
+    def __init__(self, channel, taps=8, hysteresis=4):
+        self.channel = channel
+        self.taps = taps
+        self.hysteresis = hysteresis
+        self.mv = -1  # Reported value, -1 until the first read
+
+    def read(self):
+        raw = self.channel.average(self.taps) >> 4  # Convert 16-bit to 12-bit by right shifting 4 bits
+        mv = raw * FULL_SCALE_MV // 4095  # Integer millivolts, no float math
+        if self.mv < 0 or abs(mv - self.mv) > self.hysteresis:
+            self.mv = mv
+        return self.mv
 
 def initial_Volume_value():
     
     DO_NOT_CRANK= False
     DO_NOT_KILL = False
     
-    # Retrieve analog value from pin A0:
-    adc_value = adc.read_u16() >> 4  # Convert 16-bit to 12-bit by right shifting 4 bits
-    # Convert the analog value to a voltage (0-3.3V range):
-    voltage = map_value(adc_value, 0, 4095, 0, 3.3)
+    # Filtered volume pot voltage in mV (0-3300):
+    voltage = volume_pot.read()
     print("initial Voltage: ",voltage)
-    if voltage >= 3:
+    if voltage >= 3000:
         DO_NOT_CRANK = True
-    if voltage <= .03:
+    if voltage <= 30:
         DO_NOT_KILL = True
         
    
@@ -44,6 +68,12 @@ def random_exclude(exclude, start, end):
 
 ## SPEAKER FUNCTION
 # DF PLAYER MINI
+# Non-blocking driver: commands are queued and written at most every
+# CMD_GAP_MS, replies and notifications are parsed from the UART as they
+# arrive. Call poll() from the game loop (wait() and finished() do it too).
+CMD_GAP_MS = 30  # The module drops commands sent back to back
+FINISHED_CMDS = (60, 61, 62)  # Track finished on USB / TF card / flash
+
 class DFPlayer:
     def __init__(self,uart_id,tx_pin_id=None,rx_pin_id=None):
         self.uart_id=uart_id
@@ -56,26 +86,36 @@ class DFPlayer:
         else:
             self.uart.init(9600, bits=8, parity=None, stop=1)
         
+        self.queue = []  # Pending (cmd, param1, param2)
+        self.last_send = time.ticks_ms()
+        self.out_bytes = bytearray(10)
+        self.rx_byte = bytearray(1)
+        self.frame = bytearray(10)  # Incoming frame being assembled
+        self.frame_len = 0
+        
+        # State updated from replies and notifications
+        self.playing = False
+        self.plays_queued = 0  # play() commands not yet written
+        self.tracks_finished = 0  # Count of "track finished" notifications
+        self.status = -1  # Last reply to a status query, 1 while playing
+        self.vol = -1  # Last reply to a volume query
+        self.folder_files = {}  # folder -> file count from the last query
+        self.queried_folder = 0
+        self.last_error = 0
+        
     def flush(self):
         self.uart.flush()
         if self.uart.any():
             self.uart.read()
-        
-    def send_query(self,cmd,param1=0,param2=0):
-        retry=True
-        while (retry):
-            self.flush()
-            self.send_cmd(cmd,param1,param2)
-            time.sleep(0.05)
-            in_bytes = self.uart.read()
-            if not in_bytes: #timeout
-                return -1
-            if len(in_bytes)==10 and in_bytes[1]==255 and in_bytes[9]==239:
-                retry=False
-        return in_bytes
+        self.frame_len = 0
     
     def send_cmd(self,cmd,param1=0,param2=0):
-        out_bytes = bytearray(10)
+        """Queue a command, it is written right away if the UART is free"""
+        self.queue.append((cmd,param1,param2))
+        self.poll()
+    
+    def _write(self,cmd,param1,param2):
+        out_bytes = self.out_bytes
         out_bytes[0]=126
         out_bytes[1]=255
         out_bytes[2]=6
@@ -87,18 +127,79 @@ class DFPlayer:
         checksum = 0
         for i in range(1,7):
             checksum=checksum+out_bytes[i]
-        out_bytes[7]=(checksum>>7)-1
-        out_bytes[7]=~out_bytes[7]
-        out_bytes[8]=checksum-1
-        out_bytes[8]=~out_bytes[8]
+        checksum = -checksum & 0xFFFF
+        out_bytes[7]=checksum>>8
+        out_bytes[8]=checksum&255
         self.uart.write(out_bytes)
+        self.last_send = time.ticks_ms()
+        if cmd == 15:
+            self.plays_queued -= 1
+    
+    def poll(self):
+        """Send the next queued command when due and handle incoming frames"""
+        if self.queue and time.ticks_diff(time.ticks_ms(), self.last_send) >= CMD_GAP_MS:
+            self._write(*self.queue.pop(0))
+        
+        frame = self.frame
+        while self.uart.any():
+            self.uart.readinto(self.rx_byte)
+            b = self.rx_byte[0]
+            if self.frame_len == 0 and b != 126:
+                continue  # Wait for a start byte
+            frame[self.frame_len] = b
+            self.frame_len += 1
+            if self.frame_len == 10:
+                self.frame_len = 0
+                if frame[1]==255 and frame[9]==239:
+                    self._handle(frame[3],frame[5],frame[6])
+    
+    def _handle(self,cmd,param1,param2):
+        if cmd in FINISHED_CMDS:
+            if self.plays_queued == 0:  # Not the end of a track we are replacing
+                self.playing = False
+            self.tracks_finished += 1
+        elif cmd == 66:
+            if param1 == 2:  # TF card
+                self.status = param2
+        elif cmd == 67:
+            self.vol = param2
+        elif cmd == 78:
+            self.folder_files[self.queried_folder] = param2
+        elif cmd == 64:
+            self.last_error = param2
+            self.playing = False
+    
+    def is_done(self):
+        """True once the last track played has finished"""
+        self.poll()
+        return not self.playing
+    
+    def wait(self,timeout_ms=15000):
+        """Block until the track finishes, or timeout_ms passes if the notification is lost"""
+        start = time.ticks_ms()
+        while not self.is_done():
+            if time.ticks_diff(time.ticks_ms(), start) > timeout_ms:
+                self.playing = False
+                break
+            time.sleep_ms(10)
+    
+    async def finished(self,timeout_ms=15000):
+        """Awaitable version of wait() for uasyncio tasks"""
+        start = time.ticks_ms()
+        while not self.is_done():
+            if time.ticks_diff(time.ticks_ms(), start) > timeout_ms:
+                self.playing = False
+                break
+            await asyncio.sleep_ms(10)
 
     def stop(self):
+        self.playing = False
         self.send_cmd(22,0,0)
         
     def play(self,folder,file):
-        self.stop()
-        time.sleep(0.05)
+        # Playing a track replaces the current one, no stop needed
+        self.playing = True
+        self.plays_queued += 1
         self.send_cmd(15,folder,file)
         
     def volume(self,vol):
@@ -114,31 +215,170 @@ class DFPlayer:
         self.send_cmd(12,0,1)
         
     def is_playing(self):
-        in_bytes = self.send_query(66)
-        if in_bytes==-1 or in_bytes[5]!=2:
-            return -1
-        return in_bytes[6]
+        """Tracked from play()/stop() and the track finished notification, no UART round trip"""
+        self.poll()
+        return self.playing
+    
+    def query_status(self):
+        """Ask for the play status, the reply lands in self.status"""
+        self.send_cmd(66)
     
     def get_volume(self):
-        in_bytes = self.send_query(67)
-        if in_bytes==-1 or in_bytes[3]!=67:
-            return -1
-        return in_bytes[6]
+        """Last volume reported by the module (-1 if unknown), and ask for a fresh one"""
+        self.send_cmd(67)
+        return self.vol
 
     def get_files_in_folder(self,folder):
-        in_bytes = self.send_query(78,0,folder)
-        if in_bytes==-1:
-            return -1
-        if in_bytes[3]!=78:
-            return 0
-        return in_bytes[6]
+        """Last file count reported for folder (-1 if unknown), and ask for a fresh one"""
+        self.queried_folder = folder
+        self.send_cmd(78,0,folder)
+        return self.folder_files.get(folder, -1)
+    
+    
+
+    
+## LCD FUNCTION
+# Shadow frame buffer over I2cLcd. Text is rendered into a 2x16 frame and
+# only the cells that differ from what is on the glass are sent, as raw
+# data writes that the HD44780 follows with its own address increment,
+# with a cursor move only where the changed cells are not contiguous.
+# This avoids the slow clear command and most of the I2C traffic.
+class LcdFrame:
+    def __init__(self,lcd,rows=2,cols=16):
+        self.lcd = lcd
+        self.rows = rows
+        self.cols = cols
+        self.glass = bytearray(b' ' * (rows*cols))  # What the display shows
+        self.frame = bytearray(b' ' * (rows*cols))  # Frame being drawn
+        self.cursor = 0
+        lcd.clear()
+    
+    def _render(self,string):
+        # Same wrapping as LcdApi.putstr: wrap at the last column and ignore
+        # a newline that directly follows a wrap
+        cols = self.cols
+        size = len(self.frame)
+        implied_newline = False
+        for char in string:
+            if char == '\n':
+                if not implied_newline:
+                    self.cursor = (self.cursor // cols + 1) * cols
+                implied_newline = False
+            else:
+                if self.cursor >= size:
+                    self.cursor = 0  # Wrap back to the top line like the display does
+                self.frame[self.cursor] = ord(char)
+                self.cursor += 1
+                implied_newline = self.cursor % cols == 0
+            if self.cursor >= size:
+                self.cursor = 0
+    
+    def flush(self):
+        """Send the cells that changed since the last flush"""
+        lcd = self.lcd
+        frame = self.frame
+        glass = self.glass
+        cols = self.cols
+        at = -1  # Display address as a cell index, -1 if unknown
+        for i in range(len(frame)):
+            if frame[i] != glass[i]:
+                if i != at:
+                    lcd.move_to(i % cols, i // cols)
+                lcd.hal_write_data(frame[i])  # The display advances its address itself
+                glass[i] = frame[i]
+                at = i + 1
+                if at % cols == 0:
+                    at = -1  # Past the line end the address is off screen, move explicitly
+    
+    def putstr(self,string):
+        self._render(string)
+        self.flush()
+    
+    def clear(self):
+        for i in range(len(self.frame)):
+            self.frame[i] = 32
+        self.cursor = 0
+        self.flush()
+    
+    def show(self,string):
+        """Replace the whole screen with string, same as clear() + putstr() without the blank frame"""
+        for i in range(len(self.frame)):
+            self.frame[i] = 32
+        self.cursor = 0
+        self.putstr(string)
+    
+    
+
+    
+## SWITCH FUNCTION
+# Pickup switch transitions are captured by Pin.irq handlers into a ring
+# queue with their ticks_us timestamp. The handlers only ever advance
+# head and the game only advances tail, so no lock is needed. An edge
+# within DEBOUNCE_US of the last accepted edge on the same pin is contact
+# bounce and is dropped.
+DEBOUNCE_US = 5000
+EVENT_SLOTS = 32
+
+class PickupEvents:
+    def __init__(self,pins):
+        self.pins = pins
+        self.times = array.array('i', [0] * EVENT_SLOTS)
+        self.pin_no = bytearray(EVENT_SLOTS)
+        self.levels = bytearray(EVENT_SLOTS)
+        self.head = 0  # Next slot the handlers write
+        self.tail = 0  # Next slot the game reads
+        self.dropped = 0  # Events lost to a full queue
+        self.last = array.array('i', [time.ticks_us()] * len(pins))  # Last accepted edge per pin
+        self.state = bytearray([p.value() for p in pins])  # Debounced level per pin
+        self.flag = asyncio.ThreadSafeFlag()  # Wakes the game task from the handlers
+        for i in range(len(pins)):
+            pins[i].irq(handler=self._handler(i), trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING)
+    
+    def _handler(self,i):
+        def handler(pin):
+            self._edge(i)
+        return handler
+    
+    def _edge(self,i):
+        # Interrupt context, must not allocate
+        now = time.ticks_us()
+        if time.ticks_diff(now, self.last[i]) < DEBOUNCE_US:
+            return
+        level = self.pins[i].value()
+        if level == self.state[i]:
+            return
+        self.last[i] = now
+        self.state[i] = level
+        nxt = (self.head + 1) % EVENT_SLOTS
+        if nxt == self.tail:
+            self.dropped += 1
+            return
+        self.times[self.head] = now
+        self.pin_no[self.head] = i
+        self.levels[self.head] = level
+        self.head = nxt
+        self.flag.set()
+    
+    def get(self):
+        """Oldest event as (pin index, level, ticks_us), or None if the queue is empty"""
+        if self.tail == self.head:
+            return None
+        t = self.tail
+        event = (self.pin_no[t], self.levels[t], self.times[t])
+        self.tail = (t + 1) % EVENT_SLOTS
+        return event
+    
+    def position(self):
+        """Pickup position 1-5 from the debounced levels, 0 if none is high"""
+        for i in range(len(self.state)):
+            if self.state[i]:
+                return i + 1
+        return 0
     
     
 
     
 SCORE =0
-Initial_SwitchState =0
-Final_SwitchState =0
 #PINOUT OF Controller
 
 ##SWITCH (GPIO pins INPUT, 18,19,20,21,22)
@@ -147,6 +387,7 @@ Pickup2 = machine.Pin(19,machine.Pin.IN,machine.Pin.PULL_DOWN)
 Pickup3 = machine.Pin(20,machine.Pin.IN,machine.Pin.PULL_DOWN)
 Pickup4 = machine.Pin(21,machine.Pin.IN,machine.Pin.PULL_DOWN)
 Pickup5 = machine.Pin(22,machine.Pin.IN,machine.Pin.PULL_DOWN)
+pickups = PickupEvents((Pickup1, Pickup2, Pickup3, Pickup4, Pickup5))
 
 ##BUTTON
 Butt = machine.Pin(16,machine.Pin.IN,machine.Pin.PULL_DOWN)
@@ -159,12 +400,23 @@ time.sleep(0.2)
 df.volume(30)
 time.sleep(0.2)
 
+##ADC SCANNER
+# One timer samples all analog inputs, channels keep their latest samples
+# and adc.read_u16() returns the newest one. The chord detector adds its
+# microphone (MIC_PIN = 28) to this same scanner, which then runs at 5000.
+scanner = adc_scanner.shared(1000)
+POT_RATE = 100  # Pot samples per second
+POT_BURST = 4  # Conversions averaged per pot sample
+
 ## VOLUME POTENTIOMETER
-# Initialize the analog pin for reading
-adc = ADC(Pin(26))  # Corresponds to GP26, which is ADC0 on the Pico
+adc = scanner.add(26, POT_RATE, burst=POT_BURST)  # Corresponds to GP26, which is ADC0 on the Pico
+volume_pot = Pot(adc)
 
 ##TONE POTENTIOMETER
-adc1 = ADC(Pin(27))
+adc1 = scanner.add(27, POT_RATE, burst=POT_BURST)  # GP27, ADC1
+tone_pot = Pot(adc1)
+
+scanner.start()
 
 
 ##LCD
@@ -177,318 +429,200 @@ I2C_ADDR = i2c.scan()[0]
 
 ##LCD
 #Create Object lcd for communication between library
-lcd = I2cLcd(i2c, I2C_ADDR, 2, 16)
-
-#Loop until game is started
-while True:
-    
-    if Butt.value() == True:
-        break
-    
-
-
+lcd = LcdFrame(I2cLcd(i2c, I2C_ADDR, 2, 16), 2, 16)
+
+##GAME ENGINE
+# The game runs as cooperative tasks on uasyncio: input_task samples the
+# pots and button and services the DFPlayer, pickup_task handles switch
+# events as their interrupts arrive, while the rounds
+# show messages and wait on timers. Input is never blocked, so turning a
+# pot while a message is still on screen counts, and the button skips
+# the message on screen.
+INPUT_MS = 20  # Input sampling period
+ROUND_S = 1.5  # "Round n"
+PROMPT_S = .7  # "CRANK IT!" etc., the play window already runs
+PLAY_S = 5  # Time the player has to complete a task
+MSG_S = 1.5  # Other messages
+END_S = 3  # Final score
+
+# (task, us from prompt to success) of every won round, for difficulty tuning
+reaction_times = []
+
+class Inputs:
+    """Latest controller state, kept up to date by input_task()"""
+    def __init__(self):
+        self.voltage = 0  # Volume pot, mV
+        self.tone_voltage = 0  # Tone pot, mV
+        self.switch = pickups.position()  # Pickup position 1-5, 0 if none reads high
+        self.flips = 0  # Pickup changes since the round prompt
+        self.button = False
+        self.pressed = asyncio.Event()  # Set on a button press
+        self.goal = None  # Success predicate of the running task
+        self.done = asyncio.Event()  # Set when goal() first holds
+        self.done_us = 0  # ticks_us of that moment
+
+    def set_goal(self, goal):
+        """Start checking goal() on every new sample"""
+        self.done.clear()
+        self.goal = goal
+        self.check()
+
+    def check(self):
+        if self.goal is not None and self.goal():
+            self.done_us = time.ticks_us()
+            self.goal = None
+            self.done.set()
+
+async def input_task(inputs):
+    while True:
+        inputs.voltage = volume_pot.read()
+        inputs.tone_voltage = tone_pot.read()
+        button = Butt.value() == True
+        if button and not inputs.button:
+            inputs.pressed.set()
+        inputs.button = button
+        inputs.check()
+        df.poll()
+        await asyncio.sleep_ms(INPUT_MS)
+
+async def pickup_task(inputs):
+    while True:
+        await pickups.flag.wait()
+        event = pickups.get()
+        while event is not None:
+            i, level, t = event
+            if level:  # A new position was selected
+                inputs.switch = i + 1
+                inputs.flips += 1
+            event = pickups.get()
+        inputs.check()
+
+async def wait_event(event, seconds):
+    """Wait for event for up to seconds, True if it was set"""
+    try:
+        await asyncio.wait_for(event.wait(), seconds)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+async def message(inputs, text, seconds):
+    """Show text for seconds, or until the button is pressed"""
+    lcd.show(text)
+    inputs.pressed.clear()
+    await wait_event(inputs.pressed, seconds)
+
+async def result(inputs, success):
+    global SCORE
+    if success:
+        df.play(1,3)  # Plays while the messages are on screen
+        await message(inputs, "YES, YAYYYYYYY!!!!", MSG_S)
+        await message(inputs, " +1 point,\n smartypants", MSG_S)
+        await df.finished()
+        SCORE = SCORE +1
+    else:
+        await message(inputs, "NO, LOSER!!!", MSG_S)
+        await message(inputs, " -1 point, idiot :)", MSG_S)
+        SCORE = SCORE -1
+    lcd.clear()
 
-#GAME START
-lcd.clear()
-lcd.putstr("Game will Start in...4")
-sleep(1)
-lcd.clear()
-lcd.putstr("Game will Start in...3")
-sleep(1)
-lcd.clear()
-lcd.putstr("Game will Start in...2")
-sleep(1)
-lcd.clear()
-lcd.putstr("Game will Start in...1")
-sleep(1)
-lcd.clear()
-Task =0
-for i in range(3):
-    
-    
+async def play_round(inputs, i):
     #For Tone Pot
     initial_voltage, DO_NOT_CRANK, DO_NOT_KILL = initial_Volume_value()
-    print(DO_NOT_CRANK)
-    print(DO_NOT_KILL)
     #Volume is already near max
     if DO_NOT_CRANK == True:
         Task = random_exclude(1,1,4)
-        
     #Volume is already near min
     elif DO_NOT_KILL == True:
-        Task == random_exclude(2,1,4)
-        
+        Task = random_exclude(2,1,4)
     else:
         Task = random.randint(1,4)
-        
     print("Task: ",Task)
-
+    
+    initial_tone = inputs.tone_voltage
+    Initial_SwitchState = inputs.switch
+    
+    await message(inputs, "Round "+str(i+1), ROUND_S)
+    prompt = ("CRANK IT!", "KILL IT!", "FLIP IT!", "TONE IT!")[Task-1]
+    
+    #Success predicates, checked by the input tasks as samples arrive
+    if Task == 1:
+        goal = lambda: inputs.voltage * 100 > 103 * initial_voltage
+    elif Task == 2:
+        goal = lambda: inputs.voltage * 100 < 97 * initial_voltage
+    elif Task == 3:
+        # Done at the first pickup change, even a quick flip and flip back
+        goal = lambda: inputs.flips > 0
+    else:
+        goal = lambda: not (90 * initial_tone <= inputs.tone_voltage * 100 <= 110 * initial_tone)
+    inputs.flips = 0
+    prompt_us = time.ticks_us()
+    inputs.set_goal(goal)
+    await message(inputs, prompt, PROMPT_S)
+    lcd.clear()
+    
+    #User period to complete the task, the round ends as soon as goal() holds
+    success = inputs.done.is_set() or await wait_event(inputs.done, PLAY_S - PROMPT_S)
+    inputs.goal = None
+    if success:
+        reaction_us = time.ticks_diff(inputs.done_us, prompt_us)
+        reaction_times.append((Task, reaction_us))
+        print("done after ",reaction_us,"us")
+    
+    await message(inputs, "Round "+str(i+1)+" done...\n", MSG_S)
+    
     #Crank_it! - 1 / Kill_it! - 2
     if Task == 1 or Task == 2:
-        
-        lcd.putstr("Round "+str(i+1))
-        sleep(1.5)
-        lcd.clear()
-        
-        
-        if Task == 1:
-            lcd.putstr("CRANK IT!")
-        elif Task == 2:
-            lcd.putstr("KILL IT!")
-        sleep(.7)
-        lcd.clear()
-        
-        #User Period to change Pot
-        for j in range(50):
-        
-            # Retrieve analog value from pin A0:
-            adc_value = adc.read_u16() >> 4  # Convert 16-bit to 12-bit by right shifting 4 bits
-            # Convert the analog value to a voltage (0-3.3V range):
-            voltage = map_value(adc_value, 0, 4095, 0, 3.3)
-            print("Test Voltage: ",voltage)
-        
-            time.sleep(.1)
-            
-        Final_voltage = voltage
-        print("Final Voltage: ",Final_voltage)
-        lcd.putstr("Round "+str(i+1)+" done...\n")
-        sleep(5)
-        lcd.clear()
-        
-        if Task == 1:
-            lcd.putstr("Did the volume\nincrease?")
-        elif Task ==2:
-            lcd.putstr("Did the volume\ndecrease?")
-        
-        sleep(5)
-        lcd.clear()
-        
-        # Volume is supposed to increased
+        print("initial Voltage: ",initial_voltage,"Final Voltage: ",inputs.voltage)
         if Task == 1:
-            if (Final_voltage <= (1.03 * initial_voltage)):
-                lcd.putstr("NO, LOSER!!!")
-                sleep(3)
-                lcd.clear()
-                lcd.putstr(" -1 point, idiot :)")
-                sleep(3)
-                SCORE = SCORE -1
-                lcd.clear()
-            else:
-                lcd.putstr("YES, YAYYYYYYY!!!!")
-                sleep(3)
-                lcd.clear()
-                lcd.putstr(" +1 point,\n smartypants")
-                df.play(1,3)
-                time.sleep(.2)
-                while True:
-                    
-                    if df.is_playing() == False:
-                        break;
-                SCORE = SCORE +1
-                lcd.clear()
-            
-        # Volume is supposed to decreased
+            await message(inputs, "Did the volume\nincrease?", MSG_S)
         else:
-            if (Final_voltage >= (.97 * initial_voltage)):
-                lcd.putstr("NO, LOSER!!!")
-                sleep(3)
-                lcd.clear()
-                lcd.putstr(" -1 point, idiot :)")
-                sleep(3)
-                SCORE = SCORE -1
-                lcd.clear()
-            else:
-                lcd.putstr("YES, YAYYYYYYY!!!!")
-                sleep(3)
-                lcd.clear()
-                lcd.putstr(" +1 point,\n smartypants")
-                
-  
-                df.play(1,3)
-                time.sleep(.2)
-                while True:
-                    
-                    if df.is_playing() == False:
-                        break;
-                        
-            
-                SCORE = SCORE +1
-                lcd.clear()
-            
-        
-        
+            await message(inputs, "Did the volume\ndecrease?", MSG_S)
+    
     #Flip_it!
     elif Task == 3:
-        
-       #Check initial state of the switch before task
-        if Pickup1.value()== True:
-            Initial_SwitchState= 1
-        elif Pickup2.value() == True:
-            Initial_SwitchState = 2
-        elif Pickup3.value() == True:
-            Initial_SwitchState = 3
-        elif Pickup4.value() == True:
-            Initial_SwitchState = 4
-        elif Pickup5.value() == True:
-            Initial_SwitchState = 5
-            
-        
-        print("initial state: ",Initial_SwitchState)
-            
-        lcd.putstr("Round "+str(i+1))
-        sleep(1.5)
-        lcd.clear()
-        lcd.putstr("FLIP IT!")
-        sleep(.7)
-        lcd.clear()
-        
-        
-        #User period to complete the task    
-        for j in range(10):
-            if Pickup1.value() == True:
-                Final_SwitchState = 1
-            elif Pickup2.value() == True:
-                Final_SwitchState = 2
-            elif Pickup3.value() == True:
-                Final_SwitchState = 3
-            elif Pickup4.value() == True:
-                Final_SwitchState = 4
-            elif Pickup5.value() == True:
-                Final_SwitchState = 5
-        
-            time.sleep(.5)
-        print("final state: ",Final_SwitchState)    
-        lcd.putstr("Round "+str(i+1)+" done...\n")
-        sleep(5)
-        lcd.clear()
-        lcd.putstr("Did the switch\nchange?")
-        sleep(5)
-        lcd.clear() 
-        
-        if (Initial_SwitchState == Final_SwitchState):
-            lcd.putstr("NO, LOSER!!!")
-            sleep(3)
-            lcd.clear()
-            lcd.putstr(" -1 point, idiot :)")
-            sleep(3)
-            SCORE = SCORE -1
-            lcd.clear()
-        else:
-            lcd.putstr("YES, YAYYYYYYY!!!!")
-            sleep(3)
-            lcd.clear()
-            lcd.putstr(" +1 point,\n smartypants")
-            df.play(1,3)
-            time.sleep(.2)
-            while True:
-                    
-                if df.is_playing() == False:
-                    break
-                
-            SCORE = SCORE +1
-            lcd.clear()
-   
-   #TONE IT!
+        print("initial state: ",Initial_SwitchState,"final state: ",inputs.switch,"changes: ",inputs.flips)
+        await message(inputs, "Did the switch\nchange?", MSG_S)
+    
+    #TONE IT!
     else:
-       
-        lcd.putstr("Round "+str(i+1))
-        sleep(1.5)
-        lcd.clear()
-        
-        
-        lcd.putstr("TONE IT!")
-        sleep(.7)
-        lcd.clear()
-       
-       
-        #User Period to change Pot
-        for j in range(50):
-        
-            # Retrieve analog value from pin A0:
-            adc_value = adc.read_u16() >> 4  # Convert 16-bit to 12-bit by right shifting 4 bits
-            # Convert the analog value to a voltage (0-3.3V range):
-            voltage = map_value(adc_value, 0, 4095, 0, 3.3)
-            print("Test Voltage: ",voltage)
-        
-            time.sleep(.1)
-            
-        Final_voltage = voltage
-        print("Final Voltage: ",Final_voltage)
-        lcd.putstr("Round "+str(i+1)+" done...\n")
-        sleep(5)
-        lcd.clear()
-        
-
-        
-        lcd.putstr("Did the Tone Change?")
-        sleep(5)
-        lcd.clear()
-        
-        # Volume is supposed to increased
-    
-        if Final_voltage <= 1.10 * initial_voltage and Final_voltage >= .90 * initial_voltage :
-            lcd.putstr("NO, LOSER!!!")
-            sleep(3)
-            lcd.clear()
-            lcd.putstr(" -1 point, idiot :)")
-            sleep(3)
-            SCORE = SCORE -1
-            lcd.clear()
-        else:
-            lcd.putstr("YES, YAYYYYYYY!!!!")
-            sleep(3)
-            lcd.clear()
-            lcd.putstr(" +1 point,\n smartypants")
-            df.play(1,3)
-            time.sleep(.2)
-            while True:
-                    
-                if df.is_playing() == False:
-                    break;
-                
-            SCORE = SCORE +1
-            lcd.clear()
-        
-        
-
+        print("initial Tone Voltage: ",initial_tone,"Final Voltage: ",inputs.tone_voltage)
+        await message(inputs, "Did the Tone Change?", MSG_S)
     
-lcd.putstr("Game over")
-sleep(3)
-lcd.clear()
-lcd.putstr("Final score: " + str(SCORE))
-sleep(5)
-lcd.clear()
-
-if SCORE == -3:
+    await result(inputs, success)
 
-    df.play(1,8)
-    time.sleep(.2)
-    time.sleep(10.7)
-    df.stop()
+async def game(inputs):
+    #Wait until game is started
+    inputs.pressed.clear()
+    await inputs.pressed.wait()
     
-print("end")    
+    #GAME START
+    for n in (4, 3, 2, 1):
+        lcd.show("Game will Start in..."+str(n))
+        await asyncio.sleep(1)
+    lcd.clear()
     
+    for i in range(3):
+        await play_round(inputs, i)
     
+    await message(inputs, "Game over", END_S)
+    await message(inputs, "Final score: " + str(SCORE), END_S)
+    print("reaction times (task, us): ",reaction_times)
+    lcd.clear()
     
+    if SCORE == -3:
+        df.play(1,8)
+        await asyncio.sleep(10.9)
+        df.stop()
+        df.poll()
     
-    
-    
-    
-
-
-
-    
-    
-    
-
-
-
-
-
-
-
-
-
-
+    print("end")
 
+async def main():
+    inputs = Inputs()
+    sampler = asyncio.create_task(input_task(inputs))
+    switcher = asyncio.create_task(pickup_task(inputs))
+    await game(inputs)
+    sampler.cancel()
+    switcher.cancel()
 
+asyncio.run(main())
@@ -0,0 +1,71 @@
+import array
+import struct
+import time
+
+# Binary result frame, little-endian:
+#   0  sync       0xA5
+#   1  seq        frame counter, wraps at 256
+#   2  flags      FLAG_NOTES: 12 note bins follow the score
+#   3  chord      index into ChordEngine.names, NO_CHORD if none
+#   4  ticks      time.ticks_ms() when the frame was sent, uint32
+#   8  score      chord score * 256, uint16
+#  10  notes      optional, 12 note weights (chroma) from C, clamped to 255
+#  -2  crc        CRC-16/CCITT-FALSE of every byte after sync
+SYNC = 0xA5
+FLAG_NOTES = 1
+NO_CHORD = 0xFF
+HEADER = '<BBBBIH'
+HEADER_SIZE = 10
+SIZE = HEADER_SIZE + 2
+SIZE_NOTES = HEADER_SIZE + 12 + 2
+
+
+def _crc_table():
+    table = array.array('H', [0] * 256)
+    for i in range(256):
+        c = i << 8
+        for _ in range(8):
+            c = ((c << 1) ^ 0x1021) if c & 0x8000 else (c << 1)
+        table[i] = c & 0xFFFF
+    return table
+
+
+CRC_TABLE = _crc_table()
+
+
+def crc16(buf, start, end):
+    """CRC-16/CCITT-FALSE of buf[start:end]"""
+    crc = 0xFFFF
+    for i in range(start, end):
+        crc = ((crc << 8) & 0xFFFF) ^ CRC_TABLE[(crc >> 8) ^ buf[i]]
+    return crc
+
+
+class ResultWriter:
+    """Writes result frames to a UART from one preallocated buffer, send() does not allocate"""
+
+    def __init__(self, uart, notes=False):
+        self.uart = uart
+        self.notes = notes
+        self.buf = bytearray(SIZE_NOTES if notes else SIZE)
+        self.seq = 0
+
+    def send(self, chord, score8, chroma=None):
+        """chord is an index into the engine's names or NO_CHORD, score8 its ChordEngine.score8, chroma the 12 note weights"""
+        buf = self.buf
+        if score8 > 0xFFFF:
+            score8 = 0xFFFF
+        # ticks_ms() wraps at 2**30 on MicroPython, so it fits the uint32 as it is
+        struct.pack_into(HEADER, buf, 0, SYNC, self.seq, FLAG_NOTES if self.notes else 0,
+                         chord, time.ticks_ms(), score8)
+        end = HEADER_SIZE
+        if self.notes:
+            for i in range(12):
+                v = int(chroma[i]) if chroma is not None else 0
+                buf[end + i] = v if v < 255 else 255
+            end += 12
+        crc = crc16(buf, 1, end)
+        buf[end] = crc & 0xFF
+        buf[end + 1] = crc >> 8
+        self.uart.write(buf)
+        self.seq = (self.seq + 1) & 0xFF
@@ -0,0 +1,157 @@
+import array
+import gc
+import time
+
+TOTAL_LIMIT = 1 << 30  # Totals and counts are halved here, keeps the mean and stays a small int
+GC_RESERVE = 16 * 1024  # HeapMeter collects between frames once free heap drops below this
+
+
+class StageTimer:
+    """Min/max/mean time of each processing stage, from ticks_us spans.
+
+    start() opens a frame, mark(i) closes stage i at the current time and
+    opens the next one, so the marks only cost a ticks_us() call and a few
+    array writes. The counters are preallocated and marking does not
+    allocate. Over UART, 't' dumps the counters and 'r' resets them,
+    see poll(). An optional HeapMeter adds the heap use per frame.
+    """
+
+    def __init__(self, names, meter=None):
+        self.names = names
+        self.meter = meter  # HeapMeter sampled at every start(), reported and reset along with the stages
+        n = len(names)
+        self.count = array.array('L', [0] * n)
+        self.total = array.array('L', [0] * n)  # us
+        self.min = array.array('L', [0] * n)
+        self.max = array.array('L', [0] * n)
+        self.t0 = 0
+        self.cmd = bytearray(1)
+
+    def reset(self):
+        for i in range(len(self.names)):
+            self.count[i] = 0
+            self.total[i] = 0
+            self.min[i] = 0
+            self.max[i] = 0
+        if self.meter:
+            self.meter.reset()
+
+    def start(self):
+        if self.meter:
+            self.meter.frame()
+        self.t0 = time.ticks_us()
+
+    def mark(self, i):
+        """Close stage i, the next stage starts now"""
+        t = time.ticks_us()
+        d = time.ticks_diff(t, self.t0)
+        self.t0 = t
+        c = self.count[i]
+        if c == 0 or d < self.min[i]:
+            self.min[i] = d
+        if d > self.max[i]:
+            self.max[i] = d
+        total = self.total[i] + d
+        if total >= TOTAL_LIMIT:
+            total >>= 1
+            c >>= 1
+        self.total[i] = total
+        self.count[i] = c + 1
+
+    def report(self):
+        """One line per stage: name, count, min, mean and max in us"""
+        lines = ['stage      count    min   mean    max']
+        for i in range(len(self.names)):
+            c = self.count[i]
+            mean = self.total[i] // c if c else 0
+            lines.append('%-8s %7d %6d %6d %6d' % (self.names[i], c, self.min[i], mean, self.max[i]))
+        if self.meter:
+            lines.append(self.meter.report())
+        return '\n'.join(lines)
+
+    def poll(self, uart):
+        """Handle pending UART commands: 't' writes the report, 'r' resets the counters"""
+        while uart.any():
+            if not uart.readinto(self.cmd, 1):
+                return
+            c = self.cmd[0]
+            if c == 0x74:  # 't'
+                uart.write(self.report() + '\n')
+                if self.meter:
+                    self.meter.skip()  # The report's strings are not the frame's
+            elif c == 0x72:  # 'r'
+                self.reset()
+
+
+class HeapMeter:
+    """Heap bytes allocated per frame and the garbage collection pauses.
+
+    frame() is called once per frame, between frames: it takes the
+    gc.mem_alloc() delta since the last call as the bytes that frame
+    allocated, and collects (timed) when free heap is below reserve, so
+    the collections land between frames instead of inside one. A delta
+    that went negative means an automatic collection ran inside the
+    frame; it is counted but its pause is unknown. frame() itself does
+    not allocate, a detector with an allocation-free frame path reads
+    last == 0 and dirty == 0 after its first frames.
+    """
+
+    def __init__(self, reserve=GC_RESERVE):
+        self.reserve = reserve
+        self.mark = gc.mem_alloc()
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.last = 0  # Bytes allocated by the last frame
+        self.max = 0  # Most bytes allocated by one frame
+        self.total = 0  # Bytes, halved with frames at TOTAL_LIMIT
+        self.dirty = 0  # Frames that allocated anything
+        self.collections = 0  # Collections run by frame()
+        self.auto = 0  # Automatic collections inside a frame
+        self.pause = 0  # Longest collection run by frame(), us
+        self.pause_total = 0  # us
+
+    def frame(self):
+        """Account the frame that just ended"""
+        a = gc.mem_alloc()
+        d = a - self.mark
+        if d < 0:
+            self.auto += 1
+            d = 0
+        self.last = d
+        if d:
+            self.dirty += 1
+            if d > self.max:
+                self.max = d
+        total = self.total + d
+        frames = self.frames + 1
+        if total >= TOTAL_LIMIT:
+            total >>= 1
+            frames >>= 1
+        self.total = total
+        self.frames = frames
+        if gc.mem_free() < self.reserve:
+            t = time.ticks_us()
+            gc.collect()
+            t = time.ticks_diff(time.ticks_us(), t)
+            self.collections += 1
+            if t > self.pause:
+                self.pause = t
+            self.pause_total += t
+            if self.pause_total >= TOTAL_LIMIT:
+                self.pause_total >>= 1
+            a = gc.mem_alloc()
+        self.mark = a
+
+    def skip(self):
+        """Leave the allocations since the last frame() out of the next one"""
+        self.mark = gc.mem_alloc()
+
+    def report(self):
+        """Bytes per frame and collections, one line each"""
+        mean = self.total // self.frames if self.frames else 0
+        return ('heap     %7d frames, %d allocating, bytes last %d mean %d max %d\n'
+                'gc       %7d collections, max %d us, total %d us, %d inside frames'
+                % (self.frames, self.dirty, self.last, mean, self.max,
+                   self.collections, self.pause, self.pause_total, self.auto))